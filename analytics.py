@@ -1,40 +1,58 @@
 """Analytics engine with many-to-many category support and multiple report formats."""
 from __future__ import annotations
 
+import io
 from collections import defaultdict
 from dataclasses import dataclass, field
 from datetime import datetime, timezone
 from decimal import Decimal
-from typing import Any
+from itertools import groupby
+from operator import itemgetter
+from typing import Any, Iterable, Iterator
 
 import db
 
+_merchant_fields = itemgetter("merchant", "total")
+_txn_fields = itemgetter("description", "amount_usd", "status")
+_funding_fields = itemgetter("description", "amount_usd", "type")
+_card_key = itemgetter("card")
+_timestamp_key = itemgetter("timestamp")
 
-@dataclass
+# Line templates shared by the report formatters (bound str.format methods).
+_MERCHANT_LINE = "      - {}: ${:,.2f}\n".format
+_OVERALL_MERCHANT_LINE = "  {}: ${:,.2f}\n".format
+_TXN_LINE = "  {:<30s} ${:>10,.2f}{}\n".format
+_FUNDING_LINE = "  {:<30s} ${:>10,.2f}  [{}]\n".format
+_DATED_FUNDING_LINE = "  {}  {:<25s} ${:>10,.2f}  [{}]\n".format
+
+
+@dataclass(slots=True, frozen=True)
 class CardSummary:
     card: str
     display_name: str
     categories: list[str]
     total: Decimal
+    total_cents: int
     txn_count: int
     top_merchants: list[dict]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class CategorySummary:
     name: str
     total: Decimal
     cards: list[CardSummary]
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class FundingLine:
     type: str
     total: Decimal
+    total_cents: int
     txn_count: int
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class MonthlySummary:
     year: int
     month: int
@@ -46,6 +64,11 @@ class MonthlySummary:
     funding_transactions: list[dict] = field(default_factory=list)
 
 
+def _from_cents(cents: int) -> Decimal:
+    """Exact dollar amount for an integer number of cents."""
+    return Decimal(cents).scaleb(-2)
+
+
 # ---------------------------------------------------------------------------
 # Monthly summary
 # ---------------------------------------------------------------------------
@@ -61,37 +84,35 @@ def get_monthly_summary(
     if month is None:
         month = now.month
 
-    card_totals = db.get_monthly_totals_by_card(year, month)
+    bundle = db.get_monthly_bundle(year, month, top_limit)
+    top_by_card = bundle["top_merchants"]
 
     card_summaries: dict[str, CardSummary] = {}
-    for row in card_totals:
-        categories = db.get_card_categories(row["card"])
-        top = db.get_top_merchants(
-            year, month, card=row["card"], limit=top_limit
-        )
+    for row in bundle["cards"]:
         cs = CardSummary(
             card=row["card"],
             display_name=row.get("display_name") or row["card"],
-            categories=categories,
+            categories=row["categories"],
             total=row["total"],
+            total_cents=row["total_cents"],
             txn_count=row["txn_count"],
-            top_merchants=top,
+            top_merchants=top_by_card.get(row["card"], []),
         )
         card_summaries[row["card"]] = cs
 
-    all_categories = db.get_all_categories()
+    cards_by_category: dict[str, list[CardSummary]] = defaultdict(list)
+    for cs in card_summaries.values():
+        for cat_name in cs.categories:
+            cards_by_category[cat_name].append(cs)
+
     cat_summaries: list[CategorySummary] = []
     categorized_cards: set[str] = set()
 
-    for cat in all_categories:
-        cards_in_cat = [
-            cs for cs in card_summaries.values()
-            if cat["name"] in cs.categories
-        ]
+    for cat_name, cat_total in bundle["category_totals"].items():
+        cards_in_cat = cards_by_category.get(cat_name)
         if cards_in_cat:
-            cat_total = sum((c.total for c in cards_in_cat), Decimal("0"))
             cat_summaries.append(
-                CategorySummary(name=cat["name"], total=cat_total, cards=cards_in_cat)
+                CategorySummary(name=cat_name, total=cat_total, cards=cards_in_cat)
             )
             categorized_cards.update(c.card for c in cards_in_cat)
 
@@ -100,12 +121,15 @@ def get_monthly_summary(
         if cs.card not in categorized_cards
     ]
 
-    grand_total = sum((cs.total for cs in card_summaries.values()), Decimal("0"))
-    overall_top = db.get_top_merchants(year, month, limit=top_limit)
+    grand_total = Decimal(bundle["grand_total"])
+    overall_top = bundle["overall_top"]
 
     funding_rows = db.get_monthly_funding(year, month)
     funding = [
-        FundingLine(type=r["type"], total=r["total"], txn_count=r["txn_count"])
+        FundingLine(
+            type=r["type"], total=r["total"],
+            total_cents=r["total_cents"], txn_count=r["txn_count"],
+        )
         for r in funding_rows
     ]
     funding_txns = db.get_monthly_funding_transactions(year, month)
@@ -123,56 +147,61 @@ def get_monthly_summary(
 
 
 def format_monthly_report(summary: MonthlySummary) -> str:
-    lines: list[str] = []
+    buf = io.StringIO()
+    write = buf.write
     header = f"Ether.fi Monthly Summary - {summary.year}/{summary.month:02d}"
-    lines.append(header)
-    lines.append("=" * len(header))
-    lines.append(f"Grand Total: ${summary.grand_total:,.2f}")
-    lines.append("")
+    write(f"{header}\n{'=' * len(header)}\n")
+    write(f"Grand Total: ${summary.grand_total:,.2f}\n\n")
 
     for cat in summary.categories:
-        lines.append(f"{cat.name} (${cat.total:,.2f}):")
+        write(f"{cat.name} (${cat.total:,.2f}):\n")
         for cs in cat.cards:
             card_label = f"{cs.display_name} ({cs.card})" if cs.display_name != cs.card else cs.card
             other_cats = [c for c in cs.categories if c != cat.name]
             also_in = f"  (also in: {', '.join(other_cats)})" if other_cats else ""
-            lines.append(f"  {card_label}: ${cs.total:,.2f} ({cs.txn_count} txns){also_in}")
-            if cs.top_merchants:
-                lines.append("    Top:")
-                for m in cs.top_merchants:
-                    lines.append(f"      - {m['merchant']}: ${m['total']:,.2f}")
-        lines.append("")
+            write(f"  {card_label}: ${cs.total:,.2f} ({cs.txn_count} txns){also_in}\n")
+            top = cs.top_merchants
+            if top:
+                write("    Top:\n")
+                for merchant, total in map(_merchant_fields, top):
+                    write(_MERCHANT_LINE(merchant, total))
+        write("\n")
 
     if summary.uncategorized_cards:
-        uncat_total = sum((c.total for c in summary.uncategorized_cards), Decimal("0"))
-        lines.append(f"Uncategorized (${uncat_total:,.2f}):")
+        uncat_cents = 0
+        for cs in summary.uncategorized_cards:
+            uncat_cents += cs.total_cents
+        write(f"Uncategorized (${_from_cents(uncat_cents):,.2f}):\n")
         for cs in summary.uncategorized_cards:
             card_label = f"{cs.display_name} ({cs.card})" if cs.display_name != cs.card else cs.card
-            lines.append(f"  {card_label}: ${cs.total:,.2f} ({cs.txn_count} txns)")
-            if cs.top_merchants:
-                lines.append("    Top:")
-                for m in cs.top_merchants:
-                    lines.append(f"      - {m['merchant']}: ${m['total']:,.2f}")
-        lines.append("")
+            write(f"  {card_label}: ${cs.total:,.2f} ({cs.txn_count} txns)\n")
+            top = cs.top_merchants
+            if top:
+                write("    Top:\n")
+                for merchant, total in map(_merchant_fields, top):
+                    write(_MERCHANT_LINE(merchant, total))
+        write("\n")
 
     if summary.funding:
-        funding_total = sum(f.total for f in summary.funding)
-        lines.append(f"Funding (${funding_total:,.2f}):")
+        funding_cents = 0
+        for f in summary.funding:
+            funding_cents += f.total_cents
+        write(f"Funding (${_from_cents(funding_cents):,.2f}):\n")
         for t in summary.funding_transactions:
             desc = t["description"].strip()
             amt = t["amount_usd"]
             label = t["type"].replace("_", " ").title()
             ts = t["timestamp"]
             date_str = ts.strftime("%m/%d") if hasattr(ts, "strftime") else str(ts)[:10]
-            lines.append(f"  {date_str}  {desc:<25s} ${amt:>10,.2f}  [{label}]")
-        lines.append("")
+            write(_DATED_FUNDING_LINE(date_str, desc, amt, label))
+        write("\n")
 
     if summary.overall_top_merchants:
-        lines.append("Top Merchants (All):")
-        for m in summary.overall_top_merchants:
-            lines.append(f"  {m['merchant']}: ${m['total']:,.2f}")
+        write("Top Merchants (All):\n")
+        for merchant, total in map(_merchant_fields, summary.overall_top_merchants):
+            write(_OVERALL_MERCHANT_LINE(merchant, total))
 
-    return "\n".join(lines).rstrip()
+    return buf.getvalue().rstrip()
 
 
 # ---------------------------------------------------------------------------
@@ -182,49 +211,66 @@ def format_monthly_report(summary: MonthlySummary) -> str:
 _FUNDING_TYPES = {'topup', 'swap', 'physical_card_order'}
 
 
-def format_daily_report(txns: list[dict[str, Any]], title: str | None = None) -> str:
-    if not txns:
-        return "No new transactions to report."
-
-    if title is None:
-        today = datetime.now().strftime("%Y/%m/%d")
-        title = f"Ether.fi Daily Report - {today}"
-
-    lines: list[str] = []
-    lines.append(title)
-    lines.append("=" * len(title))
-    lines.append(f"{len(txns)} transaction(s)")
-    lines.append("")
-
-    funding_txns: list[dict] = []
-    card_map: dict[str, list[dict]] = defaultdict(list)
-    for txn in txns:
-        if txn["type"] in _FUNDING_TYPES:
-            funding_txns.append(txn)
-        else:
-            card_map[txn["card"]].append(txn)
-
-    for card_id in sorted(card_map.keys()):
-        card_txns = card_map[card_id]
-        display = db.get_card_display(card_id)
-        categories = db.get_card_categories(card_id)
+def format_daily_report(
+    txns: Iterable[dict[str, Any]],
+    title: str | None = None,
+    txn_ids: list[int] | None = None,
+) -> str:
+    """Render txns grouped by card.
+
+    *txns* must be ordered by card (the db transaction queries return
+    ``ORDER BY card, timestamp DESC``); it is consumed in a single pass, so a
+    streaming iterator works. If *txn_ids* is given, the id of every rendered
+    transaction is appended to it.
+    """
+    count = 0
+    funding_txns: list[dict[str, Any]] = []
+
+    def spend_rows() -> Iterator[dict[str, Any]]:
+        nonlocal count
+        for t in txns:
+            count += 1
+            if txn_ids is not None:
+                txn_ids.append(t["id"])
+            if t["type"] in _FUNDING_TYPES:
+                funding_txns.append(t)
+            else:
+                yield t
+
+    body = io.StringIO()
+    write = body.write
+
+    displays: dict[str, str] | None = None
+    categories_by_card: dict[str, list[str]] = {}
+    for card_id, card_txns in groupby(spend_rows(), key=_card_key):
+        if displays is None:  # Only looked up when there is spend to show
+            displays = db.get_card_display_map()
+            categories_by_card = db.get_categories_by_card()
+        display = displays.get(card_id, card_id)
+        categories = categories_by_card.get(card_id, [])
         cat_str = f" [{', '.join(categories)}]" if categories else ""
-        lines.append(f"{display}{cat_str}:")
-        for t in card_txns:
-            desc = t["description"].strip()
-            amt = t["amount_usd"]
-            status = t["status"].strip()
+        write(f"{display}{cat_str}:\n")
+        for desc, amt, status in map(_txn_fields, card_txns):
+            desc = desc.strip()
+            status = status.strip()
             status_str = f"  ({status.capitalize()})" if status else ""
-            lines.append(f"  {desc:<30s} ${amt:>10,.2f}{status_str}")
-        lines.append("")
+            write(_TXN_LINE(desc, amt, status_str))
+        write("\n")
+
+    if not count:
+        return "No new transactions to report."
 
     if funding_txns:
-        lines.append("Funding:")
-        for t in funding_txns:
-            desc = t["description"].strip()
-            amt = t["amount_usd"]
-            label = t["type"].replace("_", " ").title()
-            lines.append(f"  {desc:<30s} ${amt:>10,.2f}  [{label}]")
-        lines.append("")
+        funding_txns.sort(key=_timestamp_key, reverse=True)
+        write("Funding:\n")
+        for desc, amt, txn_type in map(_funding_fields, funding_txns):
+            desc = desc.strip()
+            label = txn_type.replace("_", " ").title()
+            write(_FUNDING_LINE(desc, amt, label))
+        write("\n")
 
-    return "\n".join(lines).rstrip()
+    if title is None:
+        today = datetime.now().strftime("%Y/%m/%d")
+        title = f"Ether.fi Daily Report - {today}"
+    header = f"{title}\n{'=' * len(title)}\n{count} transaction(s)\n\n"
+    return (header + body.getvalue()).rstrip()
@@ -7,6 +7,7 @@ import json
 import logging
 import os
 from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Iterator
 
 import discord
 from discord import app_commands
@@ -18,6 +19,58 @@ import analytics
 
 log = logging.getLogger("etherfi.bot")
 
+# Sleeping schedulers wake at least this often to pick up config changes
+# (e.g. a report hour moved to later today), and retry this soon after a
+# failed schedule lookup so a DB blip doesn't skip a report.
+_SCHEDULE_RECHECK_SECS = 300
+_SCHEDULE_ERROR_RETRY_SECS = 60
+
+
+_auth_state_cache: tuple[float, dict] | None = None
+
+
+def _read_auth_state() -> dict | None:
+    """Parsed auth_state.json, re-read only when the file's mtime changes."""
+    global _auth_state_cache
+    try:
+        mtime = os.path.getmtime(config.AUTH_STATE_PATH)
+    except OSError:
+        return None
+    if _auth_state_cache is not None and _auth_state_cache[0] == mtime:
+        return _auth_state_cache[1]
+    with open(config.AUTH_STATE_PATH) as f:
+        state = json.load(f)
+    _auth_state_cache = (mtime, state)
+    return state
+
+
+def _next_daily_fire(now: datetime) -> datetime | None:
+    """Next daily_report_hour:00 after *now*, or None if disabled."""
+    report_hour = int(db.get_config("daily_report_hour"))
+    if report_hour < 0:
+        return None
+    fire = now.replace(hour=report_hour, minute=0, second=0, microsecond=0)
+    if fire <= now:
+        fire += timedelta(days=1)
+    return fire
+
+
+def _next_monthly_fire(now: datetime) -> datetime | None:
+    """Next monthly_report_day at midnight after *now*, or None if disabled."""
+    report_day = int(db.get_config("monthly_report_day"))
+    if report_day < 0:
+        return None
+    year, month = now.year, now.month
+    for _ in range(13):  # short months skip a day-31 schedule
+        try:
+            fire = datetime(year, month, report_day)
+        except ValueError:
+            fire = None
+        if fire is not None and fire > now:
+            return fire
+        year, month = (year + 1, 1) if month == 12 else (year, month + 1)
+    return None
+
 
 class EtherfiBot(discord.Client):
     def __init__(self) -> None:
@@ -25,6 +78,8 @@ class EtherfiBot(discord.Client):
         super().__init__(intents=intents)
         self.channel: discord.TextChannel | None = None
         self.tree = app_commands.CommandTree(self)
+        self._schedules: list[asyncio.Task] = []
+        self._scrape_task: asyncio.Task[bool] | None = None
 
     # ------------------------------------------------------------------
     # Lifecycle
@@ -38,8 +93,10 @@ class EtherfiBot(discord.Client):
 
     async def on_ready(self) -> None:
         log.info(f"Bot ready as {self.user}")
-        db.init_db()
-        db.migrate_seed_cards()
+        # Usually a no-op version check (main.py bot already ran it); kept off
+        # the event loop in case a migration still has to run.
+        if await asyncio.to_thread(db.init_db):
+            await asyncio.to_thread(db.migrate_seed_cards)
 
         ch = self.get_channel(config.DISCORD_CHANNEL_ID)
         if ch and isinstance(ch, discord.TextChannel):
@@ -64,10 +121,15 @@ class EtherfiBot(discord.Client):
 
         if not self.auto_fetch.is_running():
             self.auto_fetch.start()
-        if not self.daily_report_task.is_running():
-            self.daily_report_task.start()
-        if not self.monthly_report_task.is_running():
-            self.monthly_report_task.start()
+        if not self._schedules:
+            self._schedules = [
+                asyncio.create_task(
+                    self._run_on_schedule(_next_daily_fire, self.daily_report)
+                ),
+                asyncio.create_task(
+                    self._run_on_schedule(_next_monthly_fire, self.monthly_report)
+                ),
+            ]
 
     # ------------------------------------------------------------------
     # Scheduled tasks
@@ -95,22 +157,49 @@ class EtherfiBot(discord.Client):
         except Exception as e:
             log.error(f"Auto-fetch error: {e}")
 
-    @tasks.loop(minutes=1)
-    async def daily_report_task(self) -> None:
-        """At midnight (or configured hour), report yesterday's transactions."""
-        try:
-            report_hour = int(db.get_config("daily_report_hour"))
-            if report_hour < 0:
-                return
+    async def _run_on_schedule(
+        self,
+        next_fire: Callable[[datetime], datetime | None],
+        job: Callable[[datetime], Awaitable[None]],
+    ) -> None:
+        """Sleep until the next fire time, run *job*, repeat.
 
+        The schedule is re-read at least every _SCHEDULE_RECHECK_SECS so
+        config changes (or disabling with -1) take effect without a restart.
+        """
+        await self.wait_until_ready()
+        last_fire: datetime | None = None
+        while not self.is_closed():
             now = datetime.now()
-            if now.hour != report_hour or now.minute != 0:
-                return
-
+            if last_fire is not None and now < last_fire:
+                now = last_fire  # sleep() woke a little early; don't refire
+            try:
+                fire = next_fire(now)
+            except Exception as e:
+                log.error(f"Schedule lookup failed, retrying: {e}")
+                await asyncio.sleep(_SCHEDULE_ERROR_RETRY_SECS)
+                continue
+
+            if fire is None:
+                await asyncio.sleep(_SCHEDULE_RECHECK_SECS)
+                continue
+
+            delay = (fire - datetime.now()).total_seconds()
+            if delay > _SCHEDULE_RECHECK_SECS:
+                await asyncio.sleep(_SCHEDULE_RECHECK_SECS)
+                continue
+
+            await asyncio.sleep(max(delay, 0))
+            last_fire = fire
+            await job(fire)
+
+    async def daily_report(self, fire: datetime) -> None:
+        """At midnight (or configured hour), report yesterday's transactions."""
+        try:
             if not self.channel:
                 return
 
-            yesterday = now.date() - timedelta(days=1)
+            yesterday = fire.date() - timedelta(days=1)
             await self._run_scrape()  # Best-effort; use DB if scrape fails
             txns = db.get_transactions_for_date(
                 yesterday.year, yesterday.month, yesterday.day
@@ -128,37 +217,25 @@ class EtherfiBot(discord.Client):
         except Exception as e:
             log.error(f"Daily report error: {e}")
 
-    @tasks.loop(hours=1)
-    async def monthly_report_task(self) -> None:
-        """On 1st at midnight, report previous month's summary."""
+    async def monthly_report(self, fire: datetime) -> None:
+        """On the configured day at midnight, report previous month's summary."""
         try:
-            report_day = int(db.get_config("monthly_report_day"))
-            if report_day < 0:
-                return
-
-            now = datetime.now()
-            if now.day != report_day or now.hour != 0:
-                return
-
-            if now.month == 1:
-                year, month = now.year - 1, 12
+            if fire.month == 1:
+                year, month = fire.year - 1, 12
             else:
-                year, month = now.year, now.month - 1
+                year, month = fire.year, fire.month - 1
 
             if not self.channel:
                 return
 
             await self._run_scrape()  # Best-effort; use DB if scrape fails
             log.info(f"Monthly report for {year}/{month:02d}")
-            summary = analytics.get_monthly_summary(year, month)
-            report = analytics.format_monthly_report(summary)
+            report = await asyncio.to_thread(_build_monthly_report, year, month)
             await self._send_long(self.channel, report)
         except Exception as e:
             log.error(f"Monthly report error: {e}")
 
     @auto_fetch.before_loop
-    @daily_report_task.before_loop
-    @monthly_report_task.before_loop
     async def _wait_ready(self) -> None:
         await self.wait_until_ready()
 
@@ -168,11 +245,12 @@ class EtherfiBot(discord.Client):
 
     async def _check_session_expiry(self) -> None:
         """Warn in Discord if the auth session is expiring soon."""
-        if not self.channel or not os.path.isfile(config.AUTH_STATE_PATH):
+        if not self.channel:
             return
         try:
-            with open(config.AUTH_STATE_PATH) as f:
-                state = json.load(f)
+            state = await asyncio.to_thread(_read_auth_state)
+            if state is None:
+                return
             now_ts = datetime.now().timestamp()
             for cookie in state.get("cookies", []):
                 if (
@@ -190,7 +268,17 @@ class EtherfiBot(discord.Client):
             pass
 
     async def _run_scrape(self) -> bool:
-        """Run the scraper in a thread. Returns True on success, False on failure (sends noti)."""
+        """Run the scraper in a thread. Returns True on success, False on failure (sends noti).
+
+        Callers that arrive while a scrape is running (e.g. daily and monthly
+        reports both at midnight on the 1st) share its result instead of
+        contending for the browser.
+        """
+        if self._scrape_task is None or self._scrape_task.done():
+            self._scrape_task = asyncio.create_task(self._scrape_once())
+        return await asyncio.shield(self._scrape_task)
+
+    async def _scrape_once(self) -> bool:
         try:
             import scraper
 
@@ -213,19 +301,8 @@ class EtherfiBot(discord.Client):
             await channel.send(wrapped)
             return
 
-        chunks = []
-        lines = text.split("\n")
-        current = ""
-        for line in lines:
-            if len(current) + len(line) + 10 > 1900:
-                chunks.append(current)
-                current = ""
-            current += line + "\n"
-        if current.strip():
-            chunks.append(current)
-
-        for chunk in chunks:
-            await channel.send(f"```\n{chunk}```")
+        for chunk in _chunk_for_discord(text):
+            await channel.send(f"```\n{chunk}\n```")
 
     async def _send_long_followup(
         self, interaction: discord.Interaction, text: str
@@ -236,20 +313,33 @@ class EtherfiBot(discord.Client):
             await interaction.followup.send(wrapped)
             return
 
-        chunks = []
-        lines = text.split("\n")
-        current = ""
-        for line in lines:
-            if len(current) + len(line) + 10 > 1900:
-                chunks.append(current)
-                current = ""
-            current += line + "\n"
-        if current.strip():
-            chunks.append(current)
+        chunks = _chunk_for_discord(text)
+        await interaction.followup.send(f"```\n{next(chunks)}\n```")
+        for chunk in chunks:
+            await interaction.channel.send(f"```\n{chunk}\n```")
+
+
+def _build_monthly_report(
+    year: int | None, month: int | None, top_limit: int = 10
+) -> str:
+    """Query and render a monthly summary (blocking; run via asyncio.to_thread)."""
+    summary = analytics.get_monthly_summary(year, month, top_limit=top_limit)
+    return analytics.format_monthly_report(summary)
 
-        await interaction.followup.send(f"```\n{chunks[0]}```")
-        for chunk in chunks[1:]:
-            await interaction.channel.send(f"```\n{chunk}```")
+
+def _chunk_for_discord(text: str, budget: int = 1900) -> Iterator[str]:
+    """Yield slices of *text* of at most *budget* chars, split on newlines."""
+    start, end = 0, len(text)
+    while end - start > budget:
+        split = text.rfind("\n", start, start + budget + 1)
+        if split <= start:  # single line longer than budget: hard split
+            yield text[start:start + budget]
+            start += budget
+        else:
+            yield text[start:split]
+            start = split + 1
+    if start < end:
+        yield text[start:]
 
 
 # ---------------------------------------------------------------------------
@@ -282,13 +372,17 @@ async def cmd_report_latest(interaction: discord.Interaction) -> None:
             "Scrape failed (see message above). No new transactions reported."
         )
         return
-    txns = db.get_unreported_transactions()
-    if not txns:
+    reported: list[int] = []
+    report = analytics.format_daily_report(
+        db.iter_unreported_transactions(),
+        title="Ether.fi Latest Report",
+        txn_ids=reported,
+    )
+    if not reported:
         await interaction.followup.send("No new transactions to report.")
         return
 
-    report = analytics.format_daily_report(txns, title="Ether.fi Latest Report")
-    db.mark_as_reported([t["id"] for t in txns])
+    db.mark_as_reported(reported)
     await bot._send_long_followup(interaction, report)
 
 
@@ -351,8 +445,7 @@ async def cmd_report_monthly(
         return
     await interaction.response.defer()
 
-    summary = analytics.get_monthly_summary(year, month, top_limit=top)
-    report = analytics.format_monthly_report(summary)
+    report = await asyncio.to_thread(_build_monthly_report, year, month, top)
     await bot._send_long_followup(interaction, report)
 
 
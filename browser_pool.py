@@ -0,0 +1,272 @@
+"""Long-lived headless Chromium shared by successive scrapes.
+
+Playwright's sync API is bound to the thread that started it, so one owner
+thread holds the browser and runs each job against it. Callers on any thread
+(bot's asyncio.to_thread, the GUI executor, the CLI) go through run().
+"""
+from __future__ import annotations
+
+import atexit
+import json
+import os
+import queue
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from pathlib import Path
+from typing import Callable, TypeVar
+
+import config
+
+T = TypeVar("T")
+
+# auth_state.json (storage_state export) is the portable source of truth:
+# login on the host and the bot in a container share it through ./data.
+# The Chromium profile is only a per-platform cache on top of it, since
+# profile cookies are encrypted with an OS-specific key and a profile can be
+# opened by one browser at a time.
+PROFILE_DIR = Path(config.AUTH_STATE_PATH).parent / f"profile-{sys.platform}"
+_PROFILE_COOKIE_FILES = ("Default/Network/Cookies", "Default/Cookies")
+_BROWSER_ARGS = ["--disable-dev-shm-usage"]
+# Headless scraper only:
+# - Chromium's sandbox can't start as root inside the container, which is
+#   where the scraper runs; the headed login browser keeps its sandbox.
+# - Images are never read by the CSV flow. Disabling them in Blink skips the
+#   downloads without a Playwright route, which would turn off the HTTP
+#   cache and send every request through Python. Fonts and media are left
+#   to the profile's disk cache.
+_HEADLESS_ARGS = [
+    *_BROWSER_ARGS,
+    "--no-sandbox",
+    "--blink-settings=imagesEnabled=false",
+]
+
+# Replays the exported localStorage, as new_context(storage_state=...) would.
+# Init scripts run on every navigation, so each origin records the snapshot
+# (auth_state.json mtime) it applied and skips it afterwards: a token the app
+# refreshes mid-session is not rolled back by the next goto().
+_LOCAL_STORAGE_STAMP_KEY = "__etherfi_storage_state_applied"
+_LOCAL_STORAGE_JS = """
+(() => {
+  const items = %s[location.origin];
+  const stamp = %s;
+  if (!items || localStorage.getItem(%s) === stamp) return;
+  for (const { name, value } of items) localStorage.setItem(name, value);
+  localStorage.setItem(%s, stamp);
+})();
+"""
+
+_PING_INTERVAL = 30.0
+_STOP = object()
+
+_jobs: queue.Queue = queue.Queue()
+_busy = threading.Lock()
+_owner: threading.Thread | None = None
+_owner_lock = threading.Lock()
+
+
+def has_saved_session() -> bool:
+    """True if auth_state.json or this platform's profile holds a session."""
+    if os.path.isfile(config.AUTH_STATE_PATH):
+        return True
+    return any((PROFILE_DIR / f).is_file() for f in _PROFILE_COOKIE_FILES)
+
+
+def _state_mtime() -> float | None:
+    try:
+        return os.path.getmtime(config.AUTH_STATE_PATH)
+    except OSError:
+        return None
+
+
+def _load_storage_state(context) -> None:
+    """Apply auth_state.json's cookies and localStorage to the context."""
+    try:
+        stamp = str(os.path.getmtime(config.AUTH_STATE_PATH))
+        with open(config.AUTH_STATE_PATH) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return
+    if state.get("cookies"):
+        context.add_cookies(state["cookies"])
+    origins = {
+        o["origin"]: o.get("localStorage", []) for o in state.get("origins", [])
+    }
+    if origins:
+        key = json.dumps(_LOCAL_STORAGE_STAMP_KEY)
+        context.add_init_script(
+            _LOCAL_STORAGE_JS % (json.dumps(origins), json.dumps(stamp), key, key)
+        )
+
+
+def open_persistent(p, headless: bool):
+    """Launch Chromium on the persistent profile, seeded from auth_state.json.
+
+    If another process holds the profile, falls back to a throwaway browser
+    loaded from auth_state.json. Returns (context, page); release the context
+    with close_context().
+    """
+    PROFILE_DIR.mkdir(parents=True, exist_ok=True)
+    args = _HEADLESS_ARGS if headless else _BROWSER_ARGS
+    try:
+        context = p.chromium.launch_persistent_context(
+            str(PROFILE_DIR), headless=headless, args=args
+        )
+    except Exception:
+        if not os.path.isfile(config.AUTH_STATE_PATH):
+            raise
+        browser = p.chromium.launch(headless=headless, args=args)
+        context = browser.new_context(storage_state=config.AUTH_STATE_PATH)
+    else:
+        _load_storage_state(context)
+    page = context.pages[0] if context.pages else context.new_page()
+    return context, page
+
+
+def close_context(context) -> None:
+    """Close a context from open_persistent(), and its browser if it owns one."""
+    browser = context.browser  # None for a persistent context
+    context.close()
+    if browser is not None:
+        browser.close()
+
+
+# ---------------------------------------------------------------------------
+# Owner thread
+# ---------------------------------------------------------------------------
+
+def _owner_loop() -> None:
+    from playwright.sync_api import sync_playwright
+
+    p = None
+    context = None
+    loaded_mtime = None  # auth_state.json mtime the open context reflects
+    last_used = last_ping = time.monotonic()
+
+    def close() -> None:
+        nonlocal context
+        if context is not None:
+            try:
+                close_context(context)
+            except Exception:
+                pass
+            context = None
+
+    try:
+        while True:
+            try:
+                job = _jobs.get(timeout=min(_PING_INTERVAL, config.SCRAPER_POOL_IDLE_TIMEOUT))
+            except queue.Empty:
+                job = None
+            if job is _STOP:
+                break
+
+            now = time.monotonic()
+            if job is None:
+                if context is None:
+                    continue
+                if now - last_used >= config.SCRAPER_POOL_IDLE_TIMEOUT:
+                    close()
+                elif now - last_ping >= _PING_INTERVAL:
+                    try:
+                        context.pages[0].evaluate("1")
+                    except Exception:
+                        close()  # Relaunched on the next job
+                    last_ping = now
+                continue
+
+            fn, fut, warm = job
+            if not fut.set_running_or_notify_cancel():
+                continue
+            try:
+                if p is None:
+                    p = sync_playwright().start()
+                if not warm:
+                    close()  # Free the profile for the caller's own browser
+                    fut.set_result(fn(p))
+                    continue
+                if context is not None and _state_mtime() != loaded_mtime:
+                    close()  # Session re-saved elsewhere (e.g. login on the host)
+                if context is None:
+                    loaded_mtime = _state_mtime()
+                    context, _ = open_persistent(p, headless=True)
+                result = fn(context)
+                loaded_mtime = _state_mtime()  # Our own re-export, already applied
+                fut.set_result(result)
+            except BaseException as e:
+                fut.set_exception(e)
+                if context is not None and not context.pages:
+                    close()  # Browser died mid-job
+            finally:
+                last_used = last_ping = time.monotonic()
+    finally:
+        close()
+        if p is not None:
+            p.stop()
+
+
+def _ensure_owner() -> None:
+    global _owner
+    with _owner_lock:
+        if _owner is None or not _owner.is_alive():
+            _owner = threading.Thread(target=_owner_loop, name="browser-pool", daemon=True)
+            _owner.start()
+
+
+# ---------------------------------------------------------------------------
+# Public API
+# ---------------------------------------------------------------------------
+
+def _submit(fn: Callable[..., T], warm: bool, timeout: float) -> Future:
+    """Queue fn for the owner thread; the browser stays busy until it finishes."""
+    if not _busy.acquire(timeout=timeout):
+        raise RuntimeError("Browser is busy with another scrape; try again shortly.")
+    try:
+        _ensure_owner()
+        fut: Future = Future()
+        fut.add_done_callback(lambda _: _busy.release())
+        _jobs.put((fn, fut, warm))
+    except BaseException:
+        _busy.release()
+        raise
+    return fut
+
+
+def run(fn: Callable[..., T], timeout: float | None = None) -> T:
+    """Run fn(context) on the warm browser and return its result.
+
+    Waits up to timeout (default SCRAPER_POOL_ACQUIRE_TIMEOUT) for another
+    caller to finish; raises RuntimeError if the browser stays busy.
+    """
+    if timeout is None:
+        timeout = config.SCRAPER_POOL_ACQUIRE_TIMEOUT
+    return _submit(fn, True, timeout).result()
+
+
+def submit_driver(fn: Callable[..., T]) -> Future:
+    """Queue fn(playwright) on the shared driver, after closing the warm browser.
+
+    For flows that launch their own browser (login). Returns at once with a
+    Future, so the caller's thread stays free for interactive prompts; waits
+    for any running scrape instead of timing out.
+    """
+    return _submit(fn, False, -1)
+
+
+def drain() -> None:
+    """Close the browser and stop the owner thread (it restarts on demand)."""
+    global _owner
+    got = _busy.acquire(timeout=30)  # Let an in-flight scrape finish
+    try:
+        with _owner_lock:
+            owner, _owner = _owner, None
+        if owner is not None and owner.is_alive():
+            _jobs.put(_STOP)
+            owner.join(timeout=30)
+    finally:
+        if got:
+            _busy.release()
+
+
+atexit.register(drain)
@@ -9,6 +9,7 @@ import sys
 from datetime import datetime, timezone
 from decimal import Decimal, InvalidOperation
 from pathlib import Path
+from typing import Iterator, TextIO
 
 from dateutil import parser as dtparser
 
@@ -55,44 +56,123 @@ def _parse_decimal(value: str) -> Decimal | None:
         return None
 
 
+_BATCH_SIZE = 1000
+
+
+def _assign_dedup_keys(
+    batch: list[dict], key_inputs: list[tuple[str, str, str]]
+) -> None:
+    for txn, key in zip(batch, db.make_dedup_keys(key_inputs)):
+        txn["dedup_key"] = key
+
+
+def iter_csv_batches(
+    filepath: str | Path, batch_size: int = _BATCH_SIZE
+) -> Iterator[list[dict]]:
+    """Parse the CSV lazily, yielding lists of at most *batch_size* transactions."""
+    with open(filepath, newline="", encoding="utf-8") as f:
+        yield from iter_csv_stream_batches(f, batch_size)
+
+
+def iter_csv_stream_batches(
+    f: TextIO, batch_size: int = _BATCH_SIZE
+) -> Iterator[list[dict]]:
+    """Like iter_csv_batches, over an already-open text stream (newline="")."""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    # Resolve column positions once; optional columns that are absent
+    # point at a padding slot that is always "".
+    idx = {name: i for i, name in enumerate(header)}
+    blank = len(header)
+    pad = [""] * (blank + 1)
+    i_desc = idx["description"]
+    i_ts = idx["timestamp"]
+    i_amount = idx["amount USD"]
+    i_status = idx["status"]
+    i_type = idx["type"]
+    i_card = idx["card"]
+    i_holder = idx.get("card holder name", blank)
+    i_orig_amount = idx.get("original amount", blank)
+    i_orig_currency = idx.get("original currency", blank)
+    i_cashback = idx.get("cashback earned", blank)
+    i_category = idx.get("category", blank)
+
+    batch: list[dict] = []
+    key_inputs: list[tuple[str, str, str]] = []
+    for row in reader:
+        if not row:
+            continue
+        # Every row gets exactly blank + 1 fields: short rows are padded and
+        # any fields past the header are dropped, so row[blank] is always "".
+        if len(row) <= blank:
+            row.extend(pad[len(row):])
+        else:
+            del row[blank:]
+            row.append("")
+
+        description = row[i_desc].strip()
+        timestamp = row[i_ts].strip()
+        amount_usd_raw = row[i_amount].strip()
+        status = row[i_status].strip()
+
+        amount_usd = _parse_decimal(amount_usd_raw)
+        if amount_usd is None:
+            continue
+
+        ts_normalized = _normalize_timestamp(timestamp)
+        txn = {
+            "timestamp": ts_normalized,
+            "type": row[i_type].strip(),
+            "description": description,
+            "status": status,
+            "amount_usd": amount_usd,
+            "card": row[i_card].strip(),
+            "card_holder": row[i_holder].strip() or None,
+            "original_amount": _parse_decimal(row[i_orig_amount]),
+            "original_currency": row[i_orig_currency].strip() or None,
+            "cashback": _parse_decimal(row[i_cashback]),
+            "category": row[i_category].strip() or None,
+        }
+        batch.append(txn)
+        key_inputs.append((ts_normalized, amount_usd_raw, description))
+        if len(batch) >= batch_size:
+            _assign_dedup_keys(batch, key_inputs)
+            yield batch
+            batch, key_inputs = [], []
+
+    if batch:
+        _assign_dedup_keys(batch, key_inputs)
+        yield batch
+
+
 def parse_csv(filepath: str | Path) -> list[dict]:
     rows: list[dict] = []
-    with open(filepath, newline="", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            description = row["description"].strip()
-            timestamp = row["timestamp"].strip()
-            amount_usd_raw = row["amount USD"].strip()
-            status = row["status"].strip()
-
-            amount_usd = _parse_decimal(amount_usd_raw)
-            if amount_usd is None:
-                continue
-
-            ts_normalized = _normalize_timestamp(timestamp)
-            txn = {
-                "timestamp": ts_normalized,
-                "type": row["type"].strip(),
-                "description": description,
-                "status": status,
-                "amount_usd": amount_usd,
-                "card": row["card"].strip(),
-                "card_holder": row.get("card holder name", "").strip() or None,
-                "original_amount": _parse_decimal(row.get("original amount", "")),
-                "original_currency": row.get("original currency", "").strip() or None,
-                "cashback": _parse_decimal(row.get("cashback earned", "")),
-                "category": row.get("category", "").strip() or None,
-                "dedup_key": db.make_dedup_key(ts_normalized, amount_usd_raw, description),
-            }
-            rows.append(txn)
+    for batch in iter_csv_batches(filepath):
+        rows.extend(batch)
     return rows
 
 
-def import_csv(filepath: str | Path) -> int:
-    """Parse CSV and upsert all rows. Returns number of rows affected."""
-    txns = parse_csv(filepath)
-    count = db.upsert_transactions(txns)
-    return count
+def parse_csv_stream(f: TextIO) -> list[dict]:
+    rows: list[dict] = []
+    for batch in iter_csv_stream_batches(f):
+        rows.extend(batch)
+    return rows
+
+
+def import_csv(filepath: str | Path) -> tuple[int, int]:
+    """Parse CSV and upsert rows batch by batch.
+
+    Returns (rows affected, transactions parsed).
+    """
+    affected = 0
+    total = 0
+    for batch in iter_csv_batches(filepath):
+        affected += db.upsert_transactions(batch)
+        total += len(batch)
+    return affected, total
 
 
 if __name__ == "__main__":
@@ -101,6 +181,5 @@ if __name__ == "__main__":
         sys.exit(1)
     db.init_db()
     filepath = sys.argv[1]
-    affected = import_csv(filepath)
-    total = len(parse_csv(filepath))
+    affected, total = import_csv(filepath)
     print(f"Imported {total} transactions ({affected} new/updated)")
@@ -1,24 +1,76 @@
 from __future__ import annotations
 
+import atexit
 import hashlib
 import json
+import logging
+import os
+import threading
+import time
 from contextlib import contextmanager
 from datetime import datetime, timedelta, timezone
-from typing import Any, Generator
+from decimal import Decimal, InvalidOperation
+from operator import itemgetter
+from typing import Any, Generator, Iterable, Iterator, Sequence
 
 import psycopg
+from dateutil.tz import tzlocal
 from psycopg.rows import dict_row
+from psycopg_pool import ConnectionPool
 
 import config
 
+_log = logging.getLogger(__name__)
+
 # ---------------------------------------------------------------------------
 # Connection
 # ---------------------------------------------------------------------------
 
 
+_POOL_MAX_SIZE = 2 * (os.cpu_count() or 1) + 1
+
+_PREPARED_MAX = 200
+
+_pool: ConnectionPool | None = None
+_pool_lock = threading.Lock()
+
+
+def _configure_conn(conn: psycopg.Connection) -> None:
+    conn.prepare_threshold = config.DB_PREPARE_THRESHOLD
+    conn.prepared_max = _PREPARED_MAX
+
+
+def _get_pool() -> ConnectionPool:
+    """Process-wide pool, opened on first use so importing db needs no server."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    config.DATABASE_URL,
+                    min_size=2,
+                    max_size=_POOL_MAX_SIZE,
+                    kwargs={"row_factory": dict_row},
+                    configure=_configure_conn,
+                    check=ConnectionPool.check_connection,
+                    open=True,
+                )
+                atexit.register(close_pool)
+    return _pool
+
+
+def close_pool() -> None:
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
 @contextmanager
 def get_conn() -> Generator[psycopg.Connection, None, None]:
-    with psycopg.connect(config.DATABASE_URL, row_factory=dict_row) as conn:
+    # Commits on clean exit and rolls back on error, same as psycopg.connect().
+    with _get_pool().connection() as conn:
         yield conn
 
 
@@ -89,6 +141,12 @@ ON CONFLICT (key) DO NOTHING;
 _MIGRATION_SQL = """
 ALTER TABLE transactions ADD COLUMN IF NOT EXISTS reported_at TIMESTAMPTZ;
 CREATE INDEX IF NOT EXISTS idx_txn_reported ON transactions(reported_at);
+CREATE INDEX IF NOT EXISTS idx_txn_active_ts_card
+    ON transactions(timestamp, card) WHERE status <> 'CANCELLED';
+-- Only the (small) unreported set, in get_unreported_transactions' order.
+CREATE INDEX IF NOT EXISTS idx_txn_unreported
+    ON transactions(card, timestamp DESC)
+    WHERE reported_at IS NULL AND status <> 'CANCELLED';
 
 CREATE TABLE IF NOT EXISTS categories (
     name TEXT PRIMARY KEY,
@@ -120,10 +178,46 @@ END $$;
 """
 
 
-def init_db() -> None:
+# Bump whenever _SCHEMA_SQL or _MIGRATION_SQL changes; init_db skips both
+# on databases already stamped with this version.
+SCHEMA_VERSION = "1"
+
+
+def _schema_version(conn: psycopg.Connection) -> str | None:
+    exists = conn.execute("SELECT to_regclass('config') IS NOT NULL AS ok").fetchone()
+    if not exists["ok"]:
+        return None
+    row = conn.execute(
+        "SELECT value FROM config WHERE key = 'schema_version'"
+    ).fetchone()
+    return row["value"] if row else None
+
+
+def init_db() -> bool:
+    """Create and migrate the schema. Returns False if it was already current."""
     with get_conn() as conn:
+        if _schema_version(conn) == SCHEMA_VERSION:
+            return False
         conn.execute(_SCHEMA_SQL)
         conn.execute(_MIGRATION_SQL)
+        legacy_keys = conn.execute(
+            "SELECT EXISTS (SELECT 1 FROM transactions WHERE length(dedup_key) = %s)",
+            (_SHA256_HEX_LEN,),
+        ).fetchone()["exists"]
+    if legacy_keys:
+        # Rows stored with SHA-256 keys would never match new BLAKE2b keys.
+        # Legacy rows differing only by sub-second drift collapse to the same
+        # new key, so drop those duplicates first or the rewrite would hit
+        # the unique constraint.
+        dupes = deduplicate_transactions()
+        rewritten = recompute_dedup_keys()
+        _log.info(
+            "Rewrote %d legacy dedup key(s) (removed %d duplicate row(s) first)",
+            rewritten, dupes,
+        )
+    # Stamped last, so an interrupted migration is retried on next start.
+    set_config("schema_version", SCHEMA_VERSION)
+    return True
 
 
 # ---------------------------------------------------------------------------
@@ -131,14 +225,49 @@ def init_db() -> None:
 # ---------------------------------------------------------------------------
 
 
+# Config changes rarely; schedulers and pages re-read it constantly.
+# Writes through set_config invalidate immediately; writes from another
+# process are picked up once the entry expires.
+_CONFIG_TTL_SECS = 60.0
+_config_cache: dict[str, tuple[str, float]] = {}
+
+
 def get_config(key: str) -> str:
+    hit = _config_cache.get(key)
+    if hit is not None and hit[1] > time.monotonic():
+        return hit[0]
+    return get_config_fresh(key)
+
+
+def get_config_fresh(key: str) -> str:
+    """Read *key* from the database, bypassing (and then refreshing) the cache."""
     with get_conn() as conn:
         row = conn.execute("SELECT value FROM config WHERE key = %s", (key,)).fetchone()
     if row is None:
+        _config_cache.pop(key, None)
         raise KeyError(f"Config key not found: {key}")
+    _config_cache[key] = (row["value"], time.monotonic() + _CONFIG_TTL_SECS)
     return row["value"]
 
 
+_config_json_cache: dict[str, tuple[str, Any]] = {}
+
+
+def get_config_json(key: str) -> Any:
+    """JSON-decoded config value; re-decodes only when the raw text changes.
+
+    Raises KeyError if missing and json.JSONDecodeError if malformed. The
+    returned object is shared between calls: do not mutate it.
+    """
+    raw = get_config(key)
+    hit = _config_json_cache.get(key)
+    if hit is not None and hit[0] == raw:
+        return hit[1]
+    value = json.loads(raw)
+    _config_json_cache[key] = (raw, value)
+    return value
+
+
 def set_config(key: str, value: str) -> None:
     with get_conn() as conn:
         conn.execute(
@@ -148,6 +277,28 @@ def set_config(key: str, value: str) -> None:
                SET value = EXCLUDED.value, updated_at = NOW()""",
             (key, value),
         )
+    _config_cache.pop(key, None)
+
+
+def set_configs_bulk(items: Iterable[tuple[str, str]]) -> int:
+    """Write several (key, value) pairs in one statement; returns how many keys.
+
+    A repeated key keeps its last value (one upsert cannot touch a row twice).
+    """
+    latest = dict(items)
+    if not latest:
+        return 0
+    with get_conn() as conn:
+        conn.execute(
+            """INSERT INTO config (key, value, updated_at)
+               SELECT k, v, NOW() FROM unnest(%s::text[], %s::text[]) AS u(k, v)
+               ON CONFLICT (key) DO UPDATE
+               SET value = EXCLUDED.value, updated_at = NOW()""",
+            (list(latest), list(latest.values())),
+        )
+    for key in latest:
+        _config_cache.pop(key, None)
+    return len(latest)
 
 
 def get_all_config() -> list[dict[str, Any]]:
@@ -201,11 +352,22 @@ def delete_card(card: str) -> None:
         conn.execute("DELETE FROM cards WHERE card = %s", (card,))
 
 
+def format_card_display(card: str, nickname: str | None) -> str:
+    if nickname:
+        return f"{nickname} ({card})"
+    return card
+
+
 def get_card_display(card: str) -> str:
     info = get_card(card)
-    if info and info.get("nickname"):
-        return f"{info['nickname']} ({card})"
-    return card
+    return format_card_display(card, info.get("nickname") if info else None)
+
+
+def get_card_display_map() -> dict[str, str]:
+    """Display labels for every registered card, keyed by card."""
+    with get_conn() as conn:
+        rows = conn.execute("SELECT card, nickname FROM cards").fetchall()
+    return {r["card"]: format_card_display(r["card"], r["nickname"]) for r in rows}
 
 
 # ---------------------------------------------------------------------------
@@ -241,6 +403,32 @@ def get_card_categories(card: str) -> list[str]:
     return [r["category"] for r in rows]
 
 
+def get_categories_by_card() -> dict[str, list[str]]:
+    """All card → categories assignments in one query (categories sorted)."""
+    with get_conn() as conn:
+        rows = conn.execute(
+            "SELECT card, category FROM card_categories ORDER BY card, category"
+        ).fetchall()
+    result: dict[str, list[str]] = {}
+    for r in rows:
+        result.setdefault(r["card"], []).append(r["category"])
+    return result
+
+
+def get_cards_by_category() -> dict[str, list[str]]:
+    """All category → registered card ids in one query (cards sorted)."""
+    with get_conn() as conn:
+        rows = conn.execute(
+            """SELECT cc.category, cc.card FROM card_categories cc
+               JOIN cards c ON c.card = cc.card
+               ORDER BY cc.category, cc.card"""
+        ).fetchall()
+    result: dict[str, list[str]] = {}
+    for r in rows:
+        result.setdefault(r["category"], []).append(r["card"])
+    return result
+
+
 def get_cards_in_category(category: str) -> list[dict]:
     with get_conn() as conn:
         return conn.execute(
@@ -270,13 +458,24 @@ def remove_card_from_category(card: str, category: str) -> None:
 
 def set_category_cards(category: str, cards: list[str]) -> None:
     """Replace all card assignments for a category."""
+    # One statement: drop only the assignments no longer wanted and insert
+    # the missing ones (all parts share a snapshot, so rows are never
+    # deleted and re-inserted).
+    sql = """
+        WITH wanted AS (
+            SELECT DISTINCT unnest(%(cards)s::text[]) AS card
+        ),
+        removed AS (
+            DELETE FROM card_categories
+            WHERE category = %(category)s
+              AND card NOT IN (SELECT card FROM wanted)
+        )
+        INSERT INTO card_categories (card, category)
+        SELECT card, %(category)s FROM wanted
+        ON CONFLICT DO NOTHING
+    """
     with get_conn() as conn:
-        conn.execute("DELETE FROM card_categories WHERE category = %s", (category,))
-        for card in cards:
-            conn.execute(
-                "INSERT INTO card_categories (card, category) VALUES (%s, %s) ON CONFLICT DO NOTHING",
-                (card, category),
-            )
+        conn.execute(sql, {"category": category, "cards": list(cards)})
 
 
 # ---------------------------------------------------------------------------
@@ -284,30 +483,47 @@ def set_category_cards(category: str, cards: list[str]) -> None:
 # ---------------------------------------------------------------------------
 
 
-def make_dedup_key(timestamp: str, amount_usd: str, description: str) -> str:
-    from decimal import Decimal, InvalidOperation
-
+def _normalize_amount(amount_usd: str) -> str:
     try:
-        amt_norm = f"{Decimal(amount_usd.strip()):.2f}"
+        return f"{Decimal(amount_usd.strip()):.2f}"
     except (InvalidOperation, AttributeError):
-        amt_norm = amount_usd.strip()
-    raw = f"{timestamp}|{amt_norm}|{description.strip()}"
-    return hashlib.sha256(raw.encode()).hexdigest()
+        return amount_usd.strip()
+
+
+# Keys are internal identifiers, not security tokens: a 128-bit BLAKE2b
+# digest is cheaper than SHA-256 and halves the unique index.
+_DEDUP_DIGEST_SIZE = 16
+_SHA256_HEX_LEN = 64  # keys written before the switch to BLAKE2b
+
+
+def make_dedup_key(timestamp: str, amount_usd: str, description: str) -> str:
+    raw = b"|".join((
+        timestamp.encode(),
+        _normalize_amount(amount_usd).encode(),
+        description.strip().encode(),
+    ))
+    return hashlib.blake2b(raw, digest_size=_DEDUP_DIGEST_SIZE).hexdigest()
+
+
+def make_dedup_keys(rows: Iterable[tuple[str, str, str]]) -> list[str]:
+    """Batch form of make_dedup_key for (timestamp, amount_usd, description) tuples."""
+    blake2b = hashlib.blake2b
+    normalize = _normalize_amount
+    size = _DEDUP_DIGEST_SIZE
+    return [
+        blake2b(
+            b"|".join((ts.encode(), normalize(amt).encode(), desc.strip().encode())),
+            digest_size=size,
+        ).hexdigest()
+        for ts, amt, desc in rows
+    ]
 
 
 # ---------------------------------------------------------------------------
 # Transaction upsert
 # ---------------------------------------------------------------------------
 
-_UPSERT_SQL = """
-INSERT INTO transactions
-    (timestamp, type, description, status, amount_usd,
-     card, card_holder, original_amount, original_currency,
-     cashback, category, dedup_key)
-VALUES
-    (%(timestamp)s, %(type)s, %(description)s, %(status)s, %(amount_usd)s,
-     %(card)s, %(card_holder)s, %(original_amount)s, %(original_currency)s,
-     %(cashback)s, %(category)s, %(dedup_key)s)
+_UPSERT_CONFLICT_SQL = """
 ON CONFLICT (dedup_key) DO UPDATE SET
     status = EXCLUDED.status,
     amount_usd = EXCLUDED.amount_usd,
@@ -315,81 +531,172 @@ ON CONFLICT (dedup_key) DO UPDATE SET
     cashback = EXCLUDED.cashback,
     updated_at = NOW()
 WHERE transactions.status IS DISTINCT FROM EXCLUDED.status
-   OR transactions.amount_usd IS DISTINCT FROM EXCLUDED.amount_usd;
+   OR transactions.amount_usd IS DISTINCT FROM EXCLUDED.amount_usd
 """
 
+# Column order shared by the upsert statements and the COPY staging table;
+# rows are bound positionally in this order via _upsert_params.
+_UPSERT_COLS = (
+    "timestamp", "type", "description", "status", "amount_usd",
+    "card", "card_holder", "original_amount", "original_currency",
+    "cashback", "category", "dedup_key",
+)
+_UPSERT_COLS_SQL = ", ".join(_UPSERT_COLS)
+_upsert_params = itemgetter(*_UPSERT_COLS)
+
+_UPSERT_SQL = f"""
+INSERT INTO transactions ({_UPSERT_COLS_SQL})
+VALUES ({", ".join(["%s"] * len(_UPSERT_COLS))})
+""" + _UPSERT_CONFLICT_SQL
+
+# Batches at least this large go through COPY into a staging table instead
+# of the pipelined per-row upsert.
+_COPY_THRESHOLD = 500
+
+
+# Single-row form: registers the card in the same statement. The card is
+# bound once more, ahead of the row's columns.
+_UPSERT_ONE_SQL = """
+WITH new_card AS (
+    INSERT INTO cards (card) VALUES (%s) ON CONFLICT (card) DO NOTHING
+)
+""" + _UPSERT_SQL
+
 
 def upsert_transaction(txn: dict[str, Any]) -> None:
     with get_conn() as conn:
+        conn.execute(_UPSERT_ONE_SQL, (txn["card"], *_upsert_params(txn)))
+
+
+def upsert_transactions(txns: list[dict[str, Any]]) -> int:
+    """Upsert a batch of transactions. Auto-registers new cards.
+
+    Returns the number of rows inserted or updated. Large batches are
+    handed to bulk_upsert_transactions.
+    """
+    if not txns:
+        return 0
+    if len(txns) >= _COPY_THRESHOLD:
+        return bulk_upsert_transactions(txns)
+    cards = sorted({txn["card"] for txn in txns})
+    # One explicit transaction for the whole batch: a single commit, and a
+    # failure part-way leaves neither the new cards nor any rows behind.
+    with get_conn() as conn, conn.transaction():
         conn.execute(
-            "INSERT INTO cards (card) VALUES (%s) ON CONFLICT (card) DO NOTHING",
-            (txn["card"],),
+            """INSERT INTO cards (card) SELECT unnest(%s::text[])
+               ON CONFLICT (card) DO NOTHING""",
+            (cards,),
         )
-        conn.execute(_UPSERT_SQL, txn)
+        with conn.cursor() as cur:
+            # executemany pipelines the rows; rowcount is summed over all of them.
+            cur.executemany(_UPSERT_SQL, map(_upsert_params, txns))
+            return cur.rowcount
 
 
-def upsert_transactions(txns: list[dict[str, Any]]) -> int:
-    """Upsert a batch of transactions. Auto-registers new cards."""
-    count = 0
-    with get_conn() as conn:
-        for txn in txns:
-            conn.execute(
-                "INSERT INTO cards (card) VALUES (%s) ON CONFLICT (card) DO NOTHING",
-                (txn["card"],),
+def bulk_upsert_transactions(txns: list[dict[str, Any]]) -> int:
+    """Upsert a large batch via COPY into a temp table and one INSERT ... SELECT.
+
+    Rows sharing a dedup_key are collapsed to the last one first, matching
+    the per-row path (a single INSERT cannot update the same row twice).
+    """
+    if not txns:
+        return 0
+    rows = list({txn["dedup_key"]: txn for txn in txns}.values())
+    cards = sorted({txn["card"] for txn in rows})
+    with get_conn() as conn, conn.transaction():
+        conn.execute(
+            """INSERT INTO cards (card) SELECT unnest(%s::text[])
+               ON CONFLICT (card) DO NOTHING""",
+            (cards,),
+        )
+        conn.execute(
+            f"""CREATE TEMP TABLE _txn_stage ON COMMIT DROP AS
+                SELECT {_UPSERT_COLS_SQL} FROM transactions WITH NO DATA"""
+        )
+        with conn.cursor() as cur:
+            # Text format: timestamps arrive as ISO strings, which binary
+            # COPY would need pre-parsed into datetimes.
+            with cur.copy(f"COPY _txn_stage ({_UPSERT_COLS_SQL}) FROM STDIN") as cp:
+                for txn in rows:
+                    cp.write_row(_upsert_params(txn))
+            cur.execute(
+                f"""INSERT INTO transactions ({_UPSERT_COLS_SQL})
+                    SELECT {_UPSERT_COLS_SQL} FROM _txn_stage"""
+                + _UPSERT_CONFLICT_SQL
             )
-            result = conn.execute(_UPSERT_SQL, txn)
-            count += result.rowcount
-    return count
+            return cur.rowcount
 
 
 # ---------------------------------------------------------------------------
 # Unreported / daily queries
 # ---------------------------------------------------------------------------
 
+# Resolved once; tzlocal() still applies the right offset for each date.
+_LOCAL_TZ = tzlocal()
+
+# Columns the report formatters, bot, CLI and GUI read from transaction rows.
+_TXN_COLS = "id, timestamp, type, description, status, amount_usd, card, category"
+
+
+_UNREPORTED_SQL = f"""
+    SELECT {_TXN_COLS} FROM transactions
+    WHERE reported_at IS NULL AND status <> 'CANCELLED'
+    ORDER BY card, timestamp DESC
+"""
+
+# Rows fetched per round trip by the server-side (named) cursors below.
+_STREAM_ITERSIZE = 2000
+
 
 def get_unreported_transactions() -> list[dict[str, Any]]:
     with get_conn() as conn:
-        return conn.execute(
-            """SELECT * FROM transactions
-               WHERE reported_at IS NULL AND status != 'CANCELLED'
-               ORDER BY timestamp DESC"""
-        ).fetchall()
+        return conn.execute(_UNREPORTED_SQL).fetchall()
+
+
+def iter_unreported_transactions() -> Iterator[dict[str, Any]]:
+    """Stream unreported transactions through a server-side cursor.
+
+    Same rows and order as get_unreported_transactions, without holding the
+    whole backlog in memory. The connection is held until iteration ends.
+    """
+    with get_conn() as conn, conn.cursor(name="unreported_txns") as cur:
+        cur.itersize = _STREAM_ITERSIZE
+        cur.execute(_UNREPORTED_SQL)
+        yield from cur
+
+
+_MARK_CHUNK_SIZE = 10_000
 
 
 def mark_as_reported(txn_ids: list[int]) -> None:
     if not txn_ids:
         return
-    with get_conn() as conn:
-        conn.execute(
-            "UPDATE transactions SET reported_at = NOW() WHERE id = ANY(%s)",
-            (txn_ids,),
-        )
+    sql = """UPDATE transactions SET reported_at = NOW()
+             FROM unnest(%s::int[]) AS u(id)
+             WHERE transactions.id = u.id"""
+    with get_conn() as conn, conn.transaction():
+        for i in range(0, len(txn_ids), _MARK_CHUNK_SIZE):
+            conn.execute(sql, (txn_ids[i:i + _MARK_CHUNK_SIZE],))
 
 
 def get_today_transactions() -> list[dict[str, Any]]:
-    now = datetime.now().astimezone()
-    start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    end = start + timedelta(days=1)
-    with get_conn() as conn:
-        return conn.execute(
-            """SELECT * FROM transactions
-               WHERE timestamp >= %s AND timestamp < %s AND status != 'CANCELLED'
-               ORDER BY timestamp DESC""",
-            (start, end),
-        ).fetchall()
+    today = datetime.now(_LOCAL_TZ)
+    return get_transactions_for_date(today.year, today.month, today.day)
 
 
 def get_transactions_for_date(
     year: int, month: int, day: int
 ) -> list[dict[str, Any]]:
     """Transactions for a given calendar day (server local time)."""
-    start = datetime(year, month, day).astimezone()
+    # Aware arithmetic on the same tzinfo is wall-clock, so *end* is the next
+    # local midnight with its own UTC offset, even across a DST change.
+    start = datetime(year, month, day, tzinfo=_LOCAL_TZ)
     end = start + timedelta(days=1)
     with get_conn() as conn:
         return conn.execute(
-            """SELECT * FROM transactions
+            f"""SELECT {_TXN_COLS} FROM transactions
                WHERE timestamp >= %s AND timestamp < %s AND status != 'CANCELLED'
-               ORDER BY timestamp DESC""",
+               ORDER BY card, timestamp DESC""",
             (start, end),
         ).fetchall()
 
@@ -399,37 +706,111 @@ def get_transactions_for_date(
 # ---------------------------------------------------------------------------
 
 
+# Below this many rows an exact COUNT(*) is cheap, and the planner estimate
+# can lag visibly behind a fresh import until autovacuum re-analyzes.
+_COUNT_ESTIMATE_MIN = 100_000
+
+
+# reltuples is -1 (PG 14+) until the table has been analyzed. The COUNT(*)
+# subquery is an InitPlan, so it only runs when the estimate is too small.
+_TX_COUNT_SQL = f"""
+    SELECT CASE WHEN reltuples >= {_COUNT_ESTIMATE_MIN} THEN reltuples::bigint
+                ELSE (SELECT COUNT(*) FROM transactions)
+           END AS n
+    FROM pg_class WHERE oid = 'transactions'::regclass
+"""
+
+_TXN_COL_NAMES = tuple(_TXN_COLS.split(", "))
+
+
+def _recent_sql(columns: Sequence[str]) -> str:
+    # Column names are interpolated, so only known transaction columns pass.
+    unknown = set(columns).difference(_TXN_COL_NAMES)
+    if unknown or not columns:
+        raise ValueError(f"Invalid transaction columns: {sorted(unknown) or columns}")
+    return (
+        f"SELECT {', '.join(columns)} FROM transactions"
+        " ORDER BY timestamp DESC, id DESC LIMIT %s OFFSET %s"
+    )
+
+
 def get_transaction_count() -> int:
+    """Row count for display: planner estimate on large tables, else exact."""
+    with get_conn() as conn:
+        row = conn.execute(_TX_COUNT_SQL).fetchone()
+    return row["n"] if row else 0
+
+
+def get_transaction_count_exact() -> int:
+    """Exact row count, for when the planner estimate may lag (e.g. after an import)."""
     with get_conn() as conn:
         row = conn.execute("SELECT COUNT(*) AS n FROM transactions").fetchone()
     return row["n"] if row else 0
 
 
-def get_recent_transactions(limit: int = 20) -> list[dict[str, Any]]:
+def get_recent_transactions(
+    limit: int = 20,
+    offset: int = 0,
+    columns: Sequence[str] = _TXN_COL_NAMES,
+) -> list[dict[str, Any]]:
+    """Newest transactions first; *offset* pages, *columns* narrows the projection."""
     with get_conn() as conn:
-        return conn.execute(
-            "SELECT * FROM transactions ORDER BY timestamp DESC LIMIT %s",
-            (limit,),
-        ).fetchall()
+        return conn.execute(_recent_sql(columns), (limit, offset)).fetchall()
+
+
+def get_dashboard_snapshot(
+    recent_limit: int = 25,
+    recent_columns: Sequence[str] = _TXN_COL_NAMES,
+) -> dict[str, Any]:
+    """Dashboard reads in one pipelined round trip.
+
+    Returns ``{cards, tx_count, last_fetch, recent}``; ``last_fetch`` is None
+    if the key is missing.
+    """
+    with get_conn() as conn:
+        with conn.pipeline():
+            cards = conn.execute("SELECT * FROM cards ORDER BY card")
+            count = conn.execute(_TX_COUNT_SQL)
+            last = conn.execute("SELECT value FROM config WHERE key = 'last_fetch_at'")
+            recent = conn.execute(_recent_sql(recent_columns), (recent_limit, 0))
+        count_row = count.fetchone()
+        last_row = last.fetchone()
+        return {
+            "cards": cards.fetchall(),
+            "tx_count": count_row["n"] if count_row else 0,
+            "last_fetch": datetime.fromisoformat(last_row["value"]) if last_row else None,
+            "recent": recent.fetchall(),
+        }
+
+
+# Month bounds are built in SQL so they follow the session time zone exactly
+# like EXTRACT(YEAR/MONTH ...) did, but as a range the planner can match to
+# idx_txn_active_ts_card.
+_MONTH_RANGE_FILTER = """
+    t.timestamp >= make_timestamptz(%(year)s, %(month)s, 1, 0, 0, 0)
+    AND t.timestamp < make_timestamptz(%(year)s, %(month)s, 1, 0, 0, 0) + INTERVAL '1 month'
+"""
+
+_MONTHLY_SPEND_FILTER = _MONTH_RANGE_FILTER + """
+    AND t.status != 'CANCELLED'
+    AND t.type IN ('card_spend', 'card_refund', 'physical_card_refund')
+"""
 
 
 def get_monthly_totals_by_card(year: int, month: int) -> list[dict[str, Any]]:
-    sql = """
+    sql = f"""
         SELECT t.card,
                COALESCE(c.nickname, t.card) AS display_name,
                SUM(t.amount_usd) AS total,
                COUNT(*) AS txn_count
         FROM transactions t
         LEFT JOIN cards c ON t.card = c.card
-        WHERE EXTRACT(YEAR FROM t.timestamp) = %s
-          AND EXTRACT(MONTH FROM t.timestamp) = %s
-          AND t.status != 'CANCELLED'
-          AND t.type IN ('card_spend', 'card_refund', 'physical_card_refund')
+        WHERE {_MONTHLY_SPEND_FILTER}
         GROUP BY t.card, c.nickname
         ORDER BY total DESC
     """
     with get_conn() as conn:
-        return conn.execute(sql, (year, month)).fetchall()
+        return conn.execute(sql, {"year": year, "month": month}).fetchall()
 
 
 _FUNDING_TYPES = ('topup', 'swap', 'physical_card_order')
@@ -437,33 +818,35 @@ _FUNDING_TYPES = ('topup', 'swap', 'physical_card_order')
 
 def get_monthly_funding(year: int, month: int) -> list[dict[str, Any]]:
     """Non-spend activity (topups, swaps, etc.) for a given month."""
-    sql = """
-        SELECT type, SUM(amount_usd) AS total, COUNT(*) AS txn_count
-        FROM transactions
-        WHERE EXTRACT(YEAR FROM timestamp) = %s
-          AND EXTRACT(MONTH FROM timestamp) = %s
-          AND status != 'CANCELLED'
-          AND type = ANY(%s)
-        GROUP BY type
+    sql = f"""
+        SELECT t.type, SUM(t.amount_usd) AS total,
+               (SUM(t.amount_usd) * 100)::bigint AS total_cents,
+               COUNT(*) AS txn_count
+        FROM transactions t
+        WHERE {_MONTH_RANGE_FILTER}
+          AND t.status != 'CANCELLED'
+          AND t.type = ANY(%(types)s)
+        GROUP BY t.type
         ORDER BY total DESC
     """
+    params = {"year": year, "month": month, "types": list(_FUNDING_TYPES)}
     with get_conn() as conn:
-        return conn.execute(sql, (year, month, list(_FUNDING_TYPES))).fetchall()
+        return conn.execute(sql, params).fetchall()
 
 
 def get_monthly_funding_transactions(year: int, month: int) -> list[dict[str, Any]]:
     """Individual funding transactions for a given month."""
-    sql = """
-        SELECT *
-        FROM transactions
-        WHERE EXTRACT(YEAR FROM timestamp) = %s
-          AND EXTRACT(MONTH FROM timestamp) = %s
-          AND status != 'CANCELLED'
-          AND type = ANY(%s)
-        ORDER BY timestamp DESC
+    sql = f"""
+        SELECT {_TXN_COLS}
+        FROM transactions t
+        WHERE {_MONTH_RANGE_FILTER}
+          AND t.status != 'CANCELLED'
+          AND t.type = ANY(%(types)s)
+        ORDER BY t.timestamp DESC
     """
+    params = {"year": year, "month": month, "types": list(_FUNDING_TYPES)}
     with get_conn() as conn:
-        return conn.execute(sql, (year, month, list(_FUNDING_TYPES))).fetchall()
+        return conn.execute(sql, params).fetchall()
 
 
 def get_top_merchants(
@@ -474,12 +857,7 @@ def get_top_merchants(
     category: str | None = None,
     limit: int = 10,
 ) -> list[dict[str, Any]]:
-    conditions = [
-        "EXTRACT(YEAR FROM t.timestamp) = %(year)s",
-        "EXTRACT(MONTH FROM t.timestamp) = %(month)s",
-        "t.status != 'CANCELLED'",
-        "t.type IN ('card_spend', 'card_refund', 'physical_card_refund')",
-    ]
+    conditions = [_MONTHLY_SPEND_FILTER]
     params: dict[str, Any] = {"year": year, "month": month, "limit": limit}
     joins = ""
 
@@ -507,6 +885,113 @@ def get_top_merchants(
         return conn.execute(sql, params).fetchall()
 
 
+def get_monthly_bundle(year: int, month: int, top_limit: int = 10) -> dict[str, Any]:
+    """Everything the monthly summary needs, in three queries on one connection.
+
+    Returns a dict with:
+      - ``cards``: per-card rows (card, display_name, total, total_cents,
+        txn_count, categories)
+      - ``category_totals``: ``{category: total}`` for categories with spend
+      - ``grand_total``: total across all cards (each card counted once)
+      - ``top_merchants``: ``{card: [{merchant, total}, ...]}``
+      - ``overall_top``: ``[{merchant, total}, ...]`` across all cards
+    """
+    cards_sql = f"""
+        SELECT t.card,
+               COALESCE(c.nickname, t.card) AS display_name,
+               SUM(t.amount_usd) AS total,
+               (SUM(t.amount_usd) * 100)::bigint AS total_cents,
+               COUNT(*) AS txn_count,
+               COALESCE(cc.categories, '{{}}') AS categories
+        FROM transactions t
+        LEFT JOIN cards c ON t.card = c.card
+        LEFT JOIN (
+            SELECT card, array_agg(category ORDER BY category) AS categories
+            FROM card_categories
+            GROUP BY card
+        ) cc ON t.card = cc.card
+        WHERE {_MONTHLY_SPEND_FILTER}
+        GROUP BY t.card, c.nickname, cc.categories
+        ORDER BY total DESC
+    """
+    # Category subtotals come from the per-card totals joined to their
+    # categories; the grand total is taken straight from the per-card totals
+    # (a () grouping set over the join would double-count multi-category cards).
+    totals_sql = f"""
+        WITH card_totals AS (
+            SELECT t.card, SUM(t.amount_usd) AS total
+            FROM transactions t
+            WHERE {_MONTHLY_SPEND_FILTER}
+            GROUP BY t.card
+        )
+        SELECT cc.category, SUM(ct.total) AS total
+        FROM card_totals ct
+        JOIN card_categories cc ON ct.card = cc.card
+        JOIN categories cat ON cat.name = cc.category
+        GROUP BY cc.category
+        UNION ALL
+        SELECT NULL, COALESCE(SUM(total), 0) FROM card_totals
+        ORDER BY 1
+    """
+    # One grouped pass over the month's rows; the per-card ranking and the
+    # overall ranking are both derived from it.
+    merchants_sql = f"""
+        WITH per_card AS (
+            SELECT t.card,
+                   TRIM(t.description) AS merchant,
+                   SUM(t.amount_usd) AS total
+            FROM transactions t
+            WHERE {_MONTHLY_SPEND_FILTER}
+            GROUP BY t.card, TRIM(t.description)
+        ),
+        ranked AS (
+            SELECT card, merchant, total,
+                   ROW_NUMBER() OVER (PARTITION BY card ORDER BY total DESC) AS rn
+            FROM per_card
+        ),
+        overall AS (
+            SELECT merchant, SUM(total) AS total,
+                   ROW_NUMBER() OVER (ORDER BY SUM(total) DESC) AS rn
+            FROM per_card
+            GROUP BY merchant
+        )
+        SELECT card, merchant, total, rn FROM ranked WHERE rn <= %(limit)s
+        UNION ALL
+        SELECT NULL, merchant, total, rn FROM overall WHERE rn <= %(limit)s
+        ORDER BY card, rn
+    """
+    params = {"year": year, "month": month, "limit": top_limit}
+    with get_conn() as conn:
+        cards = conn.execute(cards_sql, params).fetchall()
+        total_rows = conn.execute(totals_sql, params).fetchall()
+        merchant_rows = conn.execute(merchants_sql, params).fetchall()
+
+    category_totals: dict[str, Any] = {}
+    grand_total = 0
+    for r in total_rows:
+        if r["category"] is None:
+            grand_total = r["total"]
+        else:
+            category_totals[r["category"]] = r["total"]
+
+    top_merchants: dict[str, list[dict[str, Any]]] = {}
+    overall_top: list[dict[str, Any]] = []
+    for r in merchant_rows:
+        entry = {"merchant": r["merchant"], "total": r["total"]}
+        if r["card"] is None:
+            overall_top.append(entry)
+        else:
+            top_merchants.setdefault(r["card"], []).append(entry)
+
+    return {
+        "cards": cards,
+        "category_totals": category_totals,
+        "grand_total": grand_total,
+        "top_merchants": top_merchants,
+        "overall_top": overall_top,
+    }
+
+
 # ---------------------------------------------------------------------------
 # Migration helpers
 # ---------------------------------------------------------------------------
@@ -536,11 +1021,12 @@ def migrate_seed_cards() -> None:
                 conn.execute(
                     "INSERT INTO categories (name) VALUES ('Business') ON CONFLICT DO NOTHING"
                 )
-                for bc in biz_cards:
-                    conn.execute(
-                        "INSERT INTO card_categories (card, category) VALUES (%s, %s) ON CONFLICT DO NOTHING",
-                        (bc, "Business"),
-                    )
+                conn.execute(
+                    """INSERT INTO card_categories (card, category)
+                       SELECT DISTINCT unnest(%s::text[]), 'Business'
+                       ON CONFLICT DO NOTHING""",
+                    (list(biz_cards),),
+                )
                 conn.execute("DELETE FROM config WHERE key = 'business_cards'")
         except Exception:
             pass
@@ -561,19 +1047,26 @@ def recompute_dedup_keys() -> int:
     Returns number of rows updated.
     """
     updated = 0
-    with get_conn() as conn:
-        rows = conn.execute(
-            "SELECT id, timestamp, amount_usd, description FROM transactions"
-        ).fetchall()
-        for row in rows:
-            ts = row["timestamp"].astimezone(timezone.utc).replace(microsecond=0).isoformat()
-            amt = f"{row['amount_usd']:.2f}"
-            new_key = make_dedup_key(ts, amt, row["description"])
-            result = conn.execute(
-                "UPDATE transactions SET dedup_key = %s WHERE id = %s AND dedup_key IS DISTINCT FROM %s",
-                (new_key, row["id"], new_key),
-            )
-            updated += result.rowcount
+    with get_conn() as conn, conn.cursor(name="recompute_dedup") as src:
+        # Rows stream in fixed-size chunks; the cursor's snapshot is taken at
+        # open, so rows rewritten below are not visited again.
+        src.execute("SELECT id, timestamp, amount_usd, description FROM transactions")
+        with conn.cursor() as cur:
+            while rows := src.fetchmany(_STREAM_ITERSIZE):
+                keys = make_dedup_keys(
+                    (
+                        row["timestamp"].astimezone(timezone.utc).replace(microsecond=0).isoformat(),
+                        f"{row['amount_usd']:.2f}",
+                        row["description"],
+                    )
+                    for row in rows
+                )
+                # Pipelined: a chunk's UPDATEs go out back-to-back, one sync each.
+                cur.executemany(
+                    "UPDATE transactions SET dedup_key = %s WHERE id = %s AND dedup_key IS DISTINCT FROM %s",
+                    [(key, row["id"], key) for key, row in zip(keys, rows)],
+                )
+                updated += cur.rowcount
     return updated
 
 
@@ -4,18 +4,22 @@ from __future__ import annotations
 
 import json
 import os
-import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from decimal import Decimal
+from itertools import chain
 from pathlib import Path
 
 import streamlit as st
 import pandas as pd
+import pyarrow as pa
+from dateutil.tz import tzlocal
 
 ROOT = Path(__file__).parent
 sys.path.insert(0, str(ROOT))
 
+import browser_pool
 import config
 import db
 
@@ -41,8 +45,8 @@ st.markdown(
 
 @st.cache_resource
 def _boot():
-    db.init_db()
-    db.migrate_seed_cards()
+    if db.init_db():
+        db.migrate_seed_cards()
     return True
 
 
@@ -54,41 +58,61 @@ except Exception as exc:
     st.stop()
 
 
+# ── Cached reads ───────────────────────────────────────────────────────────
+# Every widget interaction reruns the script; these keep reruns from
+# re-querying Postgres. Anything that writes calls _invalidate_caches().
+
+_CACHE_TTL = "30s"
+
+_RECENT_PAGE_SIZE = 25
+_RECENT_COLUMNS = ("timestamp", "card", "description", "amount_usd", "status")
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=16)
+def _cached_snapshot() -> dict:
+    """Cards, tx count, last fetch and the first page of recent transactions."""
+    return db.get_dashboard_snapshot(_RECENT_PAGE_SIZE, _RECENT_COLUMNS)
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=16)
+def _cached_recent_page(page: int) -> list[dict]:
+    return db.get_recent_transactions(
+        _RECENT_PAGE_SIZE, (page - 1) * _RECENT_PAGE_SIZE, _RECENT_COLUMNS
+    )
+
+
+@st.cache_data(ttl=_CACHE_TTL, max_entries=16)
+def _cached_config() -> list[dict]:
+    return db.get_all_config()
+
+
+def _cached_cards() -> list[dict]:
+    # Every tab renders on each run; all of them share the snapshot's card list.
+    return _cached_snapshot()["cards"]
+
+
+def _invalidate_caches() -> None:
+    _cached_snapshot.clear()
+    _cached_recent_page.clear()
+    _cached_config.clear()
+
+
 # ── Helpers ────────────────────────────────────────────────────────────────
 
+_LOCAL_TZ = tzlocal()
+_TIME_FMT = "%b %d, %H:%M"
 
-def _to_local(dt) -> str | None:
-    """Convert datetime from DB (UTC) to system local time string."""
-    if dt is None:
-        return None
-    # Normalize to UTC (DB stores TIMESTAMPTZ as UTC; naive = assume UTC)
-    try:
-        import pandas as _pd
-        if isinstance(dt, _pd.Timestamp):
-            ts = dt
-            if ts.tzinfo is None:
-                ts = ts.tz_localize(timezone.utc)
-            else:
-                ts = ts.tz_convert(timezone.utc)
-            local_ts = ts.tz_convert(datetime.now().astimezone().tzinfo)
-            return local_ts.strftime("%b %d, %H:%M")
-    except Exception:
-        pass
-    if isinstance(dt, datetime):
-        if dt.tzinfo is None:
-            dt = dt.replace(tzinfo=timezone.utc)
-        return dt.astimezone().strftime("%b %d, %H:%M")
-    return str(dt)
+
+def _to_local(ts: pd.Series) -> pd.Series:
+    """Format DB timestamps (UTC; naive = assume UTC) as local time strings."""
+    return pd.to_datetime(ts, utc=True).dt.tz_convert(_LOCAL_TZ).dt.strftime(_TIME_FMT)
 
 
 def _relative_time(dt: datetime) -> str:
-    now = datetime.now().astimezone()
     if dt.tzinfo is None:
         dt = dt.replace(tzinfo=timezone.utc)
-    dt_local = dt.astimezone()
-    secs = (now - dt_local).total_seconds()
-    if secs < 0:
-        return "just now"
+    # Aware datetimes subtract by instant; no local-time conversion needed.
+    secs = (datetime.now(timezone.utc) - dt).total_seconds()
     if secs < 60:
         return "just now"
     if secs < 3600:
@@ -105,27 +129,34 @@ def _fmt_usd(val) -> str:
         return str(val)
 
 
+@st.cache_data(max_entries=4)
+def _session_cookie_expiry(mtime: float) -> float | None:
+    """Expiry of the session cookie in auth_state.json.
+
+    *mtime* is only the cache key: the file is re-read when it changes.
+    """
+    with open(config.AUTH_STATE_PATH) as f:
+        state = json.load(f)
+    return next(
+        (
+            c["expires"]
+            for c in state.get("cookies", ())
+            if c.get("name", "").startswith("session_") and c.get("expires", -1) > 0
+        ),
+        None,
+    )
+
+
 def _get_session_expiry() -> tuple[str, int]:
-    """Read auth_state.json and find the session cookie expiry.
+    """Find the session cookie expiry in auth_state.json.
 
     Returns (label, days_remaining). Negative days = expired.
     """
     try:
-        import json as _json
-
-        with open(config.AUTH_STATE_PATH) as f:
-            state = _json.load(f)
-        now_ts = datetime.now().timestamp()
-        session_exp = None
-        for cookie in state.get("cookies", []):
-            name = cookie.get("name", "")
-            exp = cookie.get("expires", -1)
-            if name.startswith("session_") and exp > 0:
-                session_exp = exp
-                break
+        session_exp = _session_cookie_expiry(os.path.getmtime(config.AUTH_STATE_PATH))
         if session_exp is None:
             return "Unknown", 0
-        days = int((session_exp - now_ts) / 86400)
+        days = int((session_exp - datetime.now().timestamp()) / 86400)
         if days < 0:
             return "Expired", days
         if days <= 7:
@@ -138,11 +169,49 @@ def _get_session_expiry() -> tuple[str, int]:
 # ── Dashboard ──────────────────────────────────────────────────────────────
 
 
+@st.cache_resource
+def _fetch_executor() -> ThreadPoolExecutor:
+    # One worker shared by all sessions: fetches never overlap.
+    return ThreadPoolExecutor(max_workers=1, thread_name_prefix="fetch")
+
+
+def _fetch_transactions() -> str:
+    """Scrape and store transactions (runs on the fetch worker thread)."""
+    import scraper
+
+    txns = scraper.scrape()
+    affected = db.upsert_transactions(txns) if txns else 0
+    db.deduplicate_transactions()
+    db.update_last_fetch_at()
+    if not txns:
+        return "No transactions scraped (selectors may need updating)"
+    return f"Fetched {len(txns)} transactions ({affected} new/updated)"
+
+
+@st.fragment(run_every="2s")
+def _fetch_status():
+    """Poll the in-flight fetch; rerun the whole page once it finishes."""
+    fut = st.session_state.get("_fetch")
+    if fut is None:
+        return
+    if not fut.done():
+        st.info("Scraping …")
+        return
+    del st.session_state["_fetch"]
+    try:
+        st.session_state["_fetch_result"] = (True, fut.result())
+    except Exception as e:
+        st.session_state["_fetch_result"] = (False, str(e) or "Fetch failed")
+    _invalidate_caches()
+    st.rerun()
+
+
 def _page_dashboard():
-    cards = db.get_all_cards()
-    tx_count = db.get_transaction_count()
-    last_fetch = db.get_last_fetch_at()
-    auth_ok = os.path.isfile(config.AUTH_STATE_PATH)
+    snapshot = _cached_snapshot()
+    cards = _cached_cards()
+    tx_count = snapshot["tx_count"]
+    last_fetch = snapshot["last_fetch"]
+    auth_ok = browser_pool.has_saved_session()  # Same check as scraper.scrape()
 
     if auth_ok:
         session_label, session_days = _get_session_expiry()
@@ -152,7 +221,7 @@ def _page_dashboard():
     c1, c2, c3, c4 = st.columns(4)
     c1.metric("Cards", len(cards))
     c2.metric("Transactions", f"{tx_count:,}")
-    c3.metric("Last Fetch", _relative_time(last_fetch))
+    c3.metric("Last Fetch", _relative_time(last_fetch) if last_fetch else "Never")
     c4.metric("Session", session_label)
 
     if session_days < 0 and auth_ok:
@@ -164,28 +233,14 @@ def _page_dashboard():
 
     st.divider()
 
+    fetching = st.session_state.get("_fetch") is not None
     a1, a2, _ = st.columns([1, 1, 3])
     with a1:
-        if st.button("🔄 Fetch Now", type="primary", width="stretch"):
-            with st.spinner("Scraping …"):
-                r = subprocess.run(
-                    [sys.executable, "main.py", "scrape"],
-                    capture_output=True,
-                    text=True,
-                    cwd=str(ROOT),
-                )
-            if r.returncode == 0:
-                st.success(r.stdout.strip() or "Fetch complete")
-                st.cache_resource.clear()
-                st.rerun()
-            else:
-                err = r.stderr.strip() or r.stdout.strip() or "Fetch failed"
-                st.error(err)
-                if (
-                    "session expired" in err.lower()
-                    or "no saved session" in err.lower()
-                ):
-                    st.warning("Please run the login command first (see below).")
+        if st.button(
+            "🔄 Fetch Now", type="primary", width="stretch", disabled=fetching
+        ):
+            st.session_state["_fetch"] = _fetch_executor().submit(_fetch_transactions)
+            st.rerun()
 
     with a2:
         if st.button("🔑 Login", width="stretch"):
@@ -196,22 +251,49 @@ def _page_dashboard():
                 "then come back here and click **Fetch Now**."
             )
 
+    if fetching:
+        _fetch_status()
+    result = st.session_state.pop("_fetch_result", None)
+    if result is not None:
+        ok, msg = result
+        if ok:
+            st.success(msg)
+        else:
+            st.error(msg)
+            if "session expired" in msg.lower() or "no saved session" in msg.lower():
+                st.warning("Please run the login command first (see below).")
+
     st.divider()
 
+    _recent_transactions()
+
+
+@st.fragment(run_every="30s")
+def _recent_transactions():
+    """Recent transactions table; refreshes on its own without rerunning the page."""
     st.subheader("Recent Transactions")
-    txns = db.get_recent_transactions(25)
-    if not txns:
+    snapshot = _cached_snapshot()
+    if not snapshot["recent"]:
         st.info("No transactions yet. Import a CSV or run a fetch.")
         return
 
-    df = pd.DataFrame(txns)
-    if "timestamp" in df.columns:
-        df = df.copy()
-        df["timestamp"] = df["timestamp"].apply(_to_local)
-    display_cols = ["timestamp", "card", "description", "amount_usd", "status"]
-    existing = [c for c in display_cols if c in df.columns]
+    pages = max(1, -(-snapshot["tx_count"] // _RECENT_PAGE_SIZE))
+    page = 1
+    if pages > 1:
+        page = int(st.number_input("Page", min_value=1, max_value=pages, value=1, step=1))
+    txns = snapshot["recent"] if page == 1 else _cached_recent_page(page)
+    if not txns:
+        st.caption("No transactions on this page.")
+        return
+
+    # Arrow straight from the dict rows: st.dataframe ships Arrow to the
+    # browser, so this skips an object-dtype DataFrame in between.
+    table = pa.Table.from_pylist(txns)
+    ts_idx = table.schema.get_field_index("timestamp")
+    local = _to_local(table.column(ts_idx).to_pandas())
+    table = table.set_column(ts_idx, "timestamp", pa.array(local, type=pa.string()))
     st.dataframe(
-        df[existing],
+        table,
         column_config={
             "timestamp": "Time",
             "card": "Card",
@@ -227,6 +309,14 @@ def _page_dashboard():
 # ── Cards ──────────────────────────────────────────────────────────────────
 
 
+def _save_nickname(card: str) -> None:
+    """on_change callback: runs once per committed edit, before the rerun."""
+    new_nick = st.session_state[f"nick_{card}"]
+    db.upsert_card(card, new_nick or None)
+    _invalidate_caches()
+    st.toast(f"Nickname updated for {card}")
+
+
 def _page_cards():
     st.subheader("Registered Cards")
     st.caption(
@@ -234,11 +324,13 @@ def _page_cards():
         "Set nicknames here; manage category assignments on the **Categories** tab."
     )
 
-    cards = db.get_all_cards()
+    cards = _cached_cards()
     if not cards:
         st.info("No cards yet.")
         return
 
+    categories_by_card = db.get_categories_by_card()
+
     # Header row
     hdr = st.columns([1.2, 2.5, 3, 0.5])
     hdr[0].markdown("**Card**")
@@ -251,20 +343,17 @@ def _page_cards():
         with cols[0]:
             st.code(card["card"], language=None)
         with cols[1]:
-            cur_nick = card.get("nickname") or ""
-            new_nick = st.text_input(
+            st.text_input(
                 "Nickname",
-                value=cur_nick,
+                value=card.get("nickname") or "",
                 key=f"nick_{card['card']}",
                 label_visibility="collapsed",
                 placeholder="Set nickname …",
+                on_change=_save_nickname,
+                args=(card["card"],),
             )
-            if new_nick != cur_nick:
-                db.upsert_card(card["card"], new_nick or None)
-                st.toast(f"Nickname updated for {card['card']}")
-                st.rerun()
         with cols[2]:
-            cats = db.get_card_categories(card["card"])
+            cats = categories_by_card.get(card["card"], [])
             if cats:
                 st.markdown(" ".join(f"`{c}`" for c in cats))
             else:
@@ -272,6 +361,7 @@ def _page_cards():
         with cols[3]:
             if st.button("✕", key=f"del_card_{card['card']}"):
                 db.delete_card(card["card"])
+                _invalidate_caches()
                 st.toast(f"Removed {card['card']}")
                 st.rerun()
 
@@ -305,13 +395,20 @@ def _page_categories():
     st.divider()
 
     categories = db.get_all_categories()
+    # Read fresh alongside get_cards_by_category below: a card newer than the
+    # cached snapshot would be a multiselect default missing from options.
     all_cards = db.get_all_cards()
     all_ids = [c["card"] for c in all_cards]
+    displays = {
+        c["card"]: db.format_card_display(c["card"], c["nickname"]) for c in all_cards
+    }
 
     if not categories:
         st.info("No categories yet — create one above to start grouping your cards.")
         return
 
+    cards_by_category = db.get_cards_by_category()
+
     for cat in categories:
         with st.container(border=True):
             h1, h2 = st.columns([5, 1])
@@ -323,13 +420,13 @@ def _page_categories():
                     st.toast(f"Deleted **{cat['name']}**")
                     st.rerun()
 
-            current = [c["card"] for c in db.get_cards_in_category(cat["name"])]
+            current = cards_by_category.get(cat["name"], [])
 
             selected = st.multiselect(
                 "Assigned cards",
                 options=all_ids,
                 default=current,
-                format_func=lambda x: db.get_card_display(x),
+                format_func=lambda x: displays.get(x, x),
                 key=f"catcards_{cat['name']}",
                 label_visibility="collapsed",
             )
@@ -348,9 +445,13 @@ def _page_categories():
 
 def _page_config():
     st.subheader("Configuration")
-    st.caption("All settings are stored in the database and take effect immediately.")
+    st.caption(
+        "All settings are stored in the database. Other processes cache them "
+        "for up to 60 s; the bot re-reads report schedules every 5 minutes "
+        "and the fetch interval every 30 minutes."
+    )
 
-    rows = db.get_all_config()
+    rows = _cached_config()
 
     _DISABLEABLE = {"fetch_interval_hours", "daily_report_hour", "monthly_report_day"}
 
@@ -390,7 +491,7 @@ def _page_config():
                     )
                 vals[k] = str(num) if enabled else "-1"
 
-            elif k == "last_fetch_at":
+            elif k in ("last_fetch_at", "schema_version"):
                 st.text_input(k, value=v, disabled=True, key=f"c_{k}")
                 vals[k] = v
             elif k == "notify_channels":
@@ -404,13 +505,14 @@ def _page_config():
                 vals[k] = st.text_input(k, value=v, key=f"c_{k}")
 
         if st.form_submit_button("💾 Save All", type="primary"):
-            n = 0
-            for row in rows:
-                old = row["value"]
-                new = vals.get(row["key"], old)
-                if str(new) != str(old):
-                    db.set_config(row["key"], str(new))
-                    n += 1
+            changed = [
+                (row["key"], str(vals[row["key"]]))
+                for row in rows
+                if row["key"] in vals and str(vals[row["key"]]) != str(row["value"])
+            ]
+            n = db.set_configs_bulk(changed)
+            if n:
+                _cached_config.clear()
             st.toast(f"Saved ({n} changed)" if n else "No changes")
 
 
@@ -442,8 +544,9 @@ def _page_reports():
     if st.button("📊 Generate", type="primary"):
         with st.spinner("Generating …"):
             if rtype == "Latest":
-                txns = db.get_unreported_transactions()
-                txt = analytics.format_daily_report(txns, title="Latest Transactions")
+                txt = analytics.format_daily_report(
+                    db.iter_unreported_transactions(), title="Latest Transactions"
+                )
                 st.session_state["_report_summary"] = None
             elif rtype == "Daily":
                 txns = db.get_today_transactions()
@@ -467,24 +570,18 @@ def _page_reports():
 
 
 def _monthly_chart(summary):
-    data: list[dict] = []
-    seen: set[str] = set()
-    for cat in summary.categories:
-        for cs in cat.cards:
-            if cs.card not in seen:
-                label = cs.display_name if cs.display_name != cs.card else cs.card
-                data.append({"Card": label, "Spend (USD)": float(cs.total)})
-                seen.add(cs.card)
-    for cs in summary.uncategorized_cards:
-        if cs.card not in seen:
-            label = cs.display_name if cs.display_name != cs.card else cs.card
-            data.append({"Card": label, "Spend (USD)": float(cs.total)})
-            seen.add(cs.card)
-
-    if data:
+    # A card in several categories is charted once (first occurrence wins).
+    spend_by_card: dict[str, tuple[str, float]] = {}
+    groups = [cat.cards for cat in summary.categories]
+    groups.append(summary.uncategorized_cards)
+    for cs in chain.from_iterable(groups):
+        if cs.card not in spend_by_card:
+            spend_by_card[cs.card] = (cs.display_name, float(cs.total))
+
+    if spend_by_card:
         st.divider()
         st.caption("Spend by Card")
-        df = pd.DataFrame(data)
+        df = pd.DataFrame(list(spend_by_card.values()), columns=["Card", "Spend (USD)"])
         st.bar_chart(df, x="Card", y="Spend (USD)")
 
 
@@ -11,8 +11,8 @@ from datetime import datetime, timezone
 def _init() -> None:
     import db
 
-    db.init_db()
-    db.migrate_seed_cards()
+    if db.init_db():  # False when the schema was already current
+        db.migrate_seed_cards()
 
 
 # ---------------------------------------------------------------------------
@@ -29,7 +29,7 @@ def cmd_login(_args: argparse.Namespace) -> None:
 
 def cmd_scrape(args: argparse.Namespace) -> None:
     _init()
-    import db, scraper, analytics, notify
+    import db, scraper, notify
 
     print("[scrape] Starting headless scrape...")
     try:
@@ -65,12 +65,13 @@ def cmd_import(args: argparse.Namespace) -> None:
 
     filepath = args.file
     print(f"[import] Importing {filepath}...")
-    txns = csv_import.parse_csv(filepath)
-    affected = db.upsert_transactions(txns)
+    affected, total = csv_import.import_csv(filepath)
     dupes = db.deduplicate_transactions()
     if dupes:
         print(f"[import] Cleaned {dupes} duplicate(s)")
-    print(f"[import] Processed {len(txns)} transactions ({affected} new/updated)")
+    print(f"[import] Processed {total} transactions ({affected} new/updated)")
+    # Exact: the planner estimate lags right after a bulk load.
+    print(f"[import] {db.get_transaction_count_exact():,} transactions in database")
 
 
 def cmd_report(args: argparse.Namespace) -> None:
@@ -80,10 +81,14 @@ def cmd_report(args: argparse.Namespace) -> None:
     report_type = args.report_type
 
     if report_type == "latest":
-        txns = db.get_unreported_transactions()
-        report = analytics.format_daily_report(txns, title="Ether.fi Latest Report")
-        if txns and not args.no_send:
-            db.mark_as_reported([t["id"] for t in txns])
+        reported: list[int] = []
+        report = analytics.format_daily_report(
+            db.iter_unreported_transactions(),
+            title="Ether.fi Latest Report",
+            txn_ids=reported,
+        )
+        if reported and not args.no_send:
+            db.mark_as_reported(reported)
     elif report_type == "daily":
         txns = db.get_today_transactions()
         today = datetime.now(timezone.utc).strftime("%Y/%m/%d")
@@ -103,23 +108,23 @@ def cmd_report(args: argparse.Namespace) -> None:
 
 
 def cmd_bot(_args: argparse.Namespace) -> None:
-    _init()
+    _init()  # Before connecting: a first-boot migration must not stall the gateway
     import bot
 
     bot.run_bot()
 
 
 def cmd_gui(_args: argparse.Namespace) -> None:
-    import shutil
-    import subprocess
-
-    st_bin = shutil.which("streamlit")
-    if not st_bin:
+    try:
+        from streamlit.web import cli as stcli
+    except ImportError:
         print("Streamlit not installed. Run:  pip install streamlit")
         sys.exit(1)
 
     gui_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gui.py")
-    subprocess.run([st_bin, "run", gui_path, "--server.headless", "true"])
+    # Run Streamlit's own CLI in this interpreter instead of spawning another.
+    sys.argv = ["streamlit", "run", gui_path, "--server.headless", "true"]
+    stcli.main()
 
 
 def cmd_config(args: argparse.Namespace) -> None:
@@ -151,9 +156,10 @@ def cmd_card(args: argparse.Namespace) -> None:
         if not cards:
             print("  No cards registered. Cards are auto-discovered on import/fetch.")
             return
+        categories_by_card = db.get_categories_by_card()
         for c in cards:
             nick = c.get("nickname") or "(none)"
-            cats = db.get_card_categories(c["card"])
+            cats = categories_by_card.get(c["card"], [])
             cat_str = ", ".join(cats) if cats else "—"
             print(f"  {c['card']}  {nick:<20s}  [{cat_str}]")
 
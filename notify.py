@@ -27,9 +27,12 @@ def send(message: str) -> bool:
     Config is read from DB key 'notify_channels'.
     Returns True if at least one channel succeeded.
     """
+    if not _CHANNELS:
+        # No handler could match any configured channel; skip the DB read.
+        return False
+
     try:
-        raw = db.get_config("notify_channels")
-        channels = json.loads(raw)
+        channels = db.get_config_json("notify_channels")
     except (KeyError, json.JSONDecodeError):
         print("[notify] No notify_channels configured, skipping.")
         return False
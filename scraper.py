@@ -1,23 +1,42 @@
 """Playwright scraper for Ether.fi Cash transaction history."""
 from __future__ import annotations
 
-import os
-import tempfile
+import json
+import threading
 from pathlib import Path
+from typing import TYPE_CHECKING
 
-from playwright.sync_api import sync_playwright, Page
-
+import browser_pool
 import config
 import db
-from csv_import import parse_csv
+from csv_import import parse_csv_stream
+
+# Playwright itself is imported only by code that drives a browser, so
+# importing this module stays cheap.
+if TYPE_CHECKING:
+    from playwright.sync_api import BrowserContext, Page
+
+
+_auth_seen = False
 
 
 def _auth_state_exists() -> bool:
-    return os.path.isfile(config.AUTH_STATE_PATH)
+    # Only a positive answer is remembered: login may happen in another
+    # process (CLI) while the bot or GUI keeps this one running.
+    global _auth_seen
+    if not _auth_seen:
+        _auth_seen = browser_pool.has_saved_session()
+    return _auth_seen
+
+
+_data_dir_ensured = False
 
 
 def _ensure_data_dir() -> None:
-    Path(config.AUTH_STATE_PATH).parent.mkdir(parents=True, exist_ok=True)
+    global _data_dir_ensured
+    if not _data_dir_ensured:
+        Path(config.AUTH_STATE_PATH).parent.mkdir(parents=True, exist_ok=True)
+        _data_dir_ensured = True
 
 
 # ---------------------------------------------------------------------------
@@ -29,20 +48,38 @@ def login() -> None:
     _ensure_data_dir()
     etherfi_url = db.get_config("etherfi_url")
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
-        context = browser.new_context()
-        page = context.new_page()
-        page.goto(etherfi_url)
+    # The browser lives on the pool's owner thread (sharing its Playwright
+    # driver with later scrapes); the prompt stays here on the caller's
+    # thread, so Ctrl-C closes the browser instead of stranding input().
+    opened = threading.Event()
+    finished = threading.Event()
+    save = threading.Event()
 
+    def _login(p) -> None:
+        context, page = browser_pool.open_persistent(p, headless=False)
+        try:
+            page.goto(etherfi_url)
+            opened.set()
+            finished.wait()
+            if save.is_set():
+                # The JSON export is what other machines and processes load.
+                context.storage_state(path=config.AUTH_STATE_PATH)
+        finally:
+            browser_pool.close_context(context)
+
+    fut = browser_pool.submit_driver(_login)
+    try:
+        while not opened.wait(0.2):
+            if fut.done():
+                fut.result()  # Launch or navigation failed; re-raise it here
         print(f"Browser opened at {etherfi_url}")
         print("Please connect your wallet and sign in.")
         input("Press ENTER here after you are fully logged in...")
-
-        context.storage_state(path=config.AUTH_STATE_PATH)
-        print(f"Session saved to {config.AUTH_STATE_PATH}")
-
-        browser.close()
+        save.set()
+    finally:
+        finished.set()
+    fut.result()
+    print(f"Session saved to {config.AUTH_STATE_PATH}")
 
 
 # ---------------------------------------------------------------------------
@@ -63,29 +100,102 @@ _POPUP_DISMISS_SELECTORS = [
     'button:has-text("Got it")',
     'button:has-text("Close")',
 ]
+# One selector union, filtered to visible matches: a single query instead of
+# one round-trip per candidate.
+_POPUP_COMBINED = ", ".join(_POPUP_DISMISS_SELECTORS) + " >> visible=true"
+
+# In-page counterpart of _POPUP_DISMISS_SELECTORS (plain DOM APIs have no
+# :has-text), installed before navigation so popups are clicked away as soon
+# as they mount. Only controls inside a dialog/overlay are candidates, and the
+# observer disconnects after one dismissal or once the Transactions header
+# or login prompt has rendered; _dismiss_popups covers anything later.
+_POPUP_BUTTON_TEXTS = ["ok", "accept", "accept all", "dismiss", "got it", "close"]
+_POPUP_CONTAINER_CSS = '[role="dialog"], [role="alertdialog"], [aria-modal="true"]'
+_POPUP_CLOSE_CSS = '[aria-label="Close"], [data-testid="close"]'
+_POPUP_OBSERVER_JS = """
+(() => {
+  const texts = new Set(%s);
+  const containers = %s;
+  const closeCss = %s;
+  const ready = () =>
+    [...document.querySelectorAll("h2")].some(h => h.textContent.includes("Transactions")) ||
+    [...document.querySelectorAll("button")].some(b => /connect|sign in/i.test(b.textContent));
+  let queued = false;
+  const observer = new MutationObserver(() => {
+    if (!queued) { queued = true; requestAnimationFrame(scan); }
+  });
+  const scan = () => {
+    queued = false;
+    for (const dialog of document.querySelectorAll(containers)) {
+      for (const el of dialog.querySelectorAll("button, " + closeCss)) {
+        if (el.getClientRects().length === 0) continue;
+        if (el.matches(closeCss) || texts.has(el.textContent.trim().toLowerCase())) {
+          observer.disconnect();
+          el.click();
+          return;
+        }
+      }
+    }
+    if (ready()) observer.disconnect();
+  };
+  observer.observe(document, { childList: true, subtree: true });
+})();
+""" % (
+    json.dumps(_POPUP_BUTTON_TEXTS),
+    json.dumps(_POPUP_CONTAINER_CSS),
+    json.dumps(_POPUP_CLOSE_CSS),
+)
+
+# Download button selectors (Ether.fi may minify class names in prod)
+_DOWNLOAD_SELECTORS = (
+    'button:has(svg.lucide-arrow-down-to-line)',
+    'button:has(svg[class*="arrow-down-to-line"])',
+    'button:has(svg[class*="arrow-down"])',
+    'button[aria-label*="download" i]',
+    '[aria-label*="download" i] button',
+)
+_DOWNLOAD_COMBINED = ", ".join(_DOWNLOAD_SELECTORS) + " >> visible=true"
 
 
 def _dismiss_popups(page: Page) -> None:
     """Try to dismiss any modal/popup. Flexible — popups may or may not exist."""
-    page.wait_for_timeout(2000)
-    for selector in _POPUP_DISMISS_SELECTORS:
-        btn = page.query_selector(selector)
-        if btn and btn.is_visible():
-            try:
-                btn.click()
-                page.wait_for_timeout(1500)
-                break
-            except Exception:
-                pass
+    btn = page.query_selector(_POPUP_COMBINED)
+    if btn:
+        try:
+            btn.click()
+            btn.wait_for_element_state("hidden", timeout=1500)
+        except Exception:
+            pass
+
+
+_TRANSACTIONS_HEADER = "h2:has-text('Transactions')"
+_LOGIN_BUTTONS = 'button:has-text("Connect"), button:has-text("Sign in")'
+_LOGIN_URL_MARKERS = ("connect", "login", "sign")
+# Resolves once the Transactions header is visible or the app has redirected
+# to a login route. Login *buttons* are not a signal here: the app can show
+# them briefly while it restores the wallet session.
+_READY_OR_LOGIN_URL_JS = """
+(markers) => {
+  const url = location.href.toLowerCase();
+  if (markers.some(m => url.includes(m))) return true;
+  return [...document.querySelectorAll("h2")].some(
+    h => h.textContent.includes("Transactions") && h.getClientRects().length > 0
+  );
+}
+"""
+
+
+def _on_login_url(page: Page) -> bool:
+    current = page.url.lower()
+    return any(m in current for m in _LOGIN_URL_MARKERS)
 
 
 def _is_session_expired(page: Page) -> bool:
     """Check if we got redirected to a login/connect-wallet page."""
-    current = page.url.lower()
-    if "connect" in current or "login" in current or "sign" in current:
+    if _on_login_url(page):
         return True
-    btn = page.query_selector('button:has-text("Connect"), button:has-text("Sign in")')
-    return btn is not None and btn.is_visible()
+    # One locator count instead of query_selector + is_visible round-trips
+    return page.locator(f"{_LOGIN_BUTTONS} >> visible=true").count() > 0
 
 
 def scrape() -> list[dict]:
@@ -100,18 +210,30 @@ def scrape() -> list[dict]:
             f"No saved session at {config.AUTH_STATE_PATH}. "
             "Run 'python main.py login' first."
         )
+    return browser_pool.run(_scrape_in_context)
+
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        context = browser.new_context(storage_state=config.AUTH_STATE_PATH)
-        page = context.new_page()
+def _scrape_in_context(context: BrowserContext) -> list[dict]:
+    """Download and parse the CSV in a fresh tab of the pooled browser."""
+    from playwright.sync_api import TimeoutError as PlaywrightTimeoutError
 
+    page = context.new_page()
+    page.add_init_script(_POPUP_OBSERVER_JS)
+    try:
         # Go directly to transaction history page
-        page.goto(TRANSACTION_HISTORY_URL, wait_until="load", timeout=60_000)
-        page.wait_for_timeout(5000)
+        # Return on the response headers and wait for the app itself to
+        # render, rather than for every subresource to load.
+        page.goto(TRANSACTION_HISTORY_URL, wait_until="commit", timeout=60_000)
+        try:
+            page.wait_for_function(
+                _READY_OR_LOGIN_URL_JS, arg=list(_LOGIN_URL_MARKERS), timeout=30_000
+            )
+            expired = _on_login_url(page)
+        except PlaywrightTimeoutError:
+            # No header in time: now a visible login prompt means what it says.
+            expired = _is_session_expired(page)
 
-        if _is_session_expired(page):
-            browser.close()
+        if expired:
             raise RuntimeError(
                 "Session expired. Run 'python main.py login' to re-authenticate."
             )
@@ -119,52 +241,38 @@ def scrape() -> list[dict]:
         _dismiss_popups(page)
 
         # Wait for page to stabilize (transaction list + download button render)
-        page.wait_for_selector("h2:has-text('Transactions')", timeout=15_000)
-        page.wait_for_timeout(3000)
-
-        # Download button selectors (Ether.fi may minify class names in prod)
-        download_selectors = [
-            'button:has(svg.lucide-arrow-down-to-line)',
-            'button:has(svg[class*="arrow-down-to-line"])',
-            'button:has(svg[class*="arrow-down"])',
-            'button[aria-label*="download" i]',
-            '[aria-label*="download" i] button',
-        ]
-        download_btn = None
-        for sel in download_selectors:
-            try:
-                download_btn = page.wait_for_selector(sel, state="visible", timeout=10_000)
-                if download_btn:
-                    break
-            except Exception:
-                continue
+        page.wait_for_selector(_TRANSACTIONS_HEADER, timeout=15_000)
+
+        try:
+            download_btn = page.wait_for_selector(
+                _DOWNLOAD_COMBINED, state="visible", timeout=15_000
+            )
+        except PlaywrightTimeoutError:
+            download_btn = None
 
         if not download_btn:
-            browser.close()
             raise RuntimeError(
                 "Could not find download button on transaction-history page. "
                 "Page may have changed or a popup may be blocking it."
             )
 
         download_btn.scroll_into_view_if_needed()
-        page.wait_for_timeout(500)
 
         with page.expect_download(timeout=30_000) as download_info:
             download_btn.click()
 
+        # Parse Playwright's own download artifact in place; delete it now
+        # rather than when the long-lived pooled context eventually closes.
         download = download_info.value
-        with tempfile.NamedTemporaryFile(
-            suffix=".csv", delete=False
-        ) as f:
-            tmp_path = f.name
-        download.save_as(tmp_path)
         try:
-            txns = parse_csv(tmp_path)
+            with open(download.path(), newline="", encoding="utf-8") as f:
+                txns = parse_csv_stream(f)
         finally:
-            os.unlink(tmp_path)
+            download.delete()
 
-        # Save updated session state
+        # Refresh the JSON export so cookie-expiry readers see the new session
         context.storage_state(path=config.AUTH_STATE_PATH)
-        browser.close()
+    finally:
+        page.close()
 
     return txns
@@ -1,5 +1,6 @@
 #!/usr/bin/env python3
 """Run inside Docker to debug transaction-history page DOM. No DB needed."""
+import json
 import os
 import sys
 
@@ -34,20 +35,20 @@ with sync_playwright() as p:
 
     page.wait_for_timeout(3000)
 
-    # Check download button selectors
+    # Check download button selectors, dump buttons and UA in one round-trip
+    # (these selectors are plain CSS, so they work with querySelector).
     selectors = [
         'button:has(svg.lucide-arrow-down-to-line)',
         'button:has(svg[class*="arrow-down-to-line"])',
         'button:has(svg[class*="arrow-down"])',
     ]
-    print("\n--- Selector check ---")
-    for sel in selectors:
-        el = page.query_selector(sel)
-        print(f"  {sel}: found={el is not None}, visible={el.is_visible() if el else 'N/A'}")
-
-    # Dump buttons in the filter bar area (where download usually is)
     info = page.evaluate("""
-        () => {
+        (selectors) => {
+            const checks = {};
+            for (const sel of selectors) {
+                const el = document.querySelector(sel);
+                checks[sel] = { found: el !== null, visible: el ? el.offsetParent !== null : null };
+            }
             const buttons = document.querySelectorAll('button');
             const results = [];
             buttons.forEach((b, i) => {
@@ -62,18 +63,22 @@ with sync_playwright() as p:
                     });
                 }
             });
-            return results.slice(0, 20);
+            return { checks, buttons: results.slice(0, 20), ua: navigator.userAgent };
         }
-    """)
+    """, selectors)
+
+    print("\n--- Selector check ---")
+    for sel, c in info["checks"].items():
+        visible = c["visible"] if c["found"] else "N/A"
+        print(f"  {sel}: found={c['found']}, visible={visible}")
+
     print("\n--- Buttons with arrow/down or in flex ---")
-    import json
-    for r in info:
+    for r in info["buttons"]:
         print(json.dumps(r, indent=2, default=str))
 
     # User agent
-    ua = page.evaluate("() => navigator.userAgent")
     print("\n--- User-Agent ---")
-    print(ua[:150])
+    print(info["ua"][:150])
 
     browser.close()
     print("\nDone.")